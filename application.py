@@ -1,9 +1,19 @@
+import io
+import math
+import sys
+from datetime import date
+
 import pygame
 
 import graphics
 from graphics import Board, Button, Text, Clock, ScrollableText, ToggleButton
+import engine
+import journal
+import notation
+import pgn
 import pieces
-from typing import Optional, Tuple, List
+import rules
+from typing import Dict, Optional, List
 
 """
 Contains event and click handling.
@@ -15,7 +25,10 @@ pygame.mixer.init()
 SCREEN_WIDTH, SCREEN_HEIGHT = pygame.display.Info().current_w, pygame.display.Info().current_h
 CURRENT_SCREEN = "Menu"
 
-FPS = 60
+FPS = 60  # Only while a piece is dragged, otherwise the main loop sleeps until something happens.
+IDLE_TIMEOUT = 1000  # Milliseconds, the longest sleep of the main loop.
+COMPUTER_MOVE_EVENT = pygame.event.custom_type()  # Posted by the search thread when the computer's move is ready.
+SAVE_ERROR_EVENT = pygame.event.custom_type()  # Posted by the journal writer thread when saving a game failed.
 
 pieces_group = pygame.sprite.Group()
 is_white_on_turn = True
@@ -24,10 +37,33 @@ selected_piece: Optional[pieces.Piece] = None
 selected_piece_group = pygame.sprite.GroupSingle()
 before_promotion_row, before_promotion_col = None, None
 before_promotion_taken_piece: Optional[pieces.Piece] = None
-last_move: Optional[Tuple[Tuple[int, int], Tuple[int, int]]] = None  # [[from row, from col], [to row, to col]]
+last_move: Optional[rules.Move] = None  # Packed rules core move, see rules.decode_move.
+start_fen = rules.Position.initial().to_fen()  # The starting position of the game, for saving it.
+game_moves: List[rules.Move] = []  # Every move of the game as packed rules core moves, shown in SAN by move_list.
+# Every game is saved to the journal after each move and when it ends, under its id. The writes are done by a
+# background thread, so a slow disk does not freeze the frame. Another running instance gets its own journal.
+# It is opened by get_journal_writer() when the first game is set up, so an error cannot stop the application.
+GAME_JOURNAL_PATH = 'games/games.journal'
+journal_writer: Optional[journal.JournalWriter] = None
+journal_open_error: Optional[OSError] = None  # Games are not saved if the journal could not be opened.
+game_id = 0
 is_onturn_king_in_check = False
+is_game_over = False
+
+# Computer opponent: plays the color the human did not pick, until the first of these limits is reached.
+COMPUTER_MAX_DEPTH = 6
+COMPUTER_NODE_BUDGET = 40000
+COMPUTER_TIME_LIMIT = 1.0  # seconds
+computer = engine.Engine(COMPUTER_MAX_DEPTH, COMPUTER_NODE_BUDGET, COMPUTER_TIME_LIMIT)
+# The search runs in a background thread, its result is polled after the thread wakes up the main loop.
+computer_worker = engine.SearchWorker(computer, lambda: pygame.event.post(pygame.event.Event(COMPUTER_MOVE_EVENT)))
+# The search thread holds the GIL for the whole switch interval (5 ms by default), a shorter one keeps frames smooth.
+sys.setswitchinterval(0.001)
+is_computer_opponent = True
+human_is_white = True
 
 BACKGROUND_COLOR = (122, 104, 70)
+screen_regions = graphics.DirtyRegions()  # What the screen showed in the last frame, only the changes are drawn.
 board = Board((SCREEN_WIDTH // 2 - graphics.SQUARE_SIZE * 4), (SCREEN_HEIGHT // 2 - graphics.SQUARE_SIZE * 4))
 
 game_buttons: List[Button] = []
@@ -41,8 +77,10 @@ five_button = Button(300, 220, 150, 70, (72, 245, 66), "5 + 0", 25, (100, 100, 2
 ten_button = Button(500, 220, 150, 70, (72, 245, 66), "10 + 0", 25, (100, 100, 200), True, graphics.menu_onclick)
 white_button = Button(200, 350, 150, 70, (72, 245, 66), "White", 25, (100, 100, 200), True, graphics.menu_onclick)
 black_button = Button(420, 350, 150, 70, (72, 245, 66), "Black", 25, (100, 100, 200), True, graphics.menu_onclick)
+computer_button = Button(640, 350, 150, 70, (72, 245, 66), "Computer", 25, (100, 100, 200), True,
+                         graphics.menu_onclick)
 start_button = Button(300, 460, 150, 70, (72, 245, 66), "Start", 25, (100, 100, 200), True, graphics.menu_onclick)
-menu_buttons = [three_button, five_button, ten_button, white_button, black_button, start_button]
+menu_buttons = [three_button, five_button, ten_button, white_button, black_button, computer_button, start_button]
 selected_button = 180
 print(selected_button)
 
@@ -64,6 +102,9 @@ def initial_menu_buttons():
     color_buttons[0].selected = True
     color_buttons[0].background_color = (245, 215, 66)
 
+    computer_button.selected = True
+    computer_button.background_color = (245, 215, 66)
+
     # start_button.selected = True
     # start_button.background_color = (245, 215, 66)
 
@@ -71,6 +112,11 @@ def initial_menu_buttons():
 welcome_text = Text(250, 150, "Welcome to our chess game!", 25, pygame.Color(0, 20, 20), True)
 welcome_text.set_text("Welcome to our chess game!", 'Comic_sans')
 menu_texts.append(welcome_text)
+fen_text = Text(100, 560, "Start from position (FEN, optional):", 25, pygame.Color(0, 20, 20), True)
+menu_texts.append(fen_text)
+fen_error_text = Text(100, 660, "", 20, pygame.Color(200, 0, 0), False)
+menu_texts.append(fen_error_text)
+fen_input = graphics.TextInput(100, 600, 900, 50, 22, pygame.Color(0, 0, 0), (255, 255, 255), True)
 
 turn_board_button = Button(0, 0, 250, 65, pygame.Color(20, 150, 0),
                            "Tábla megfordítása", 28, pygame.Color(0, 0, 0), True, graphics.turn_board)
@@ -84,6 +130,7 @@ resign_button.set_text("Feladás")
 resign_button.is_visible = True
 game_buttons.append(resign_button)
 
+CLOCK_DELAY = 0  # Seconds of every turn which are not counted (simple delay mode).
 white_clock = Clock(100, 450, 300, 100, selected_button, 36, bg_color=(200, 200, 200))
 black_clock = Clock(100, 350, 300, 100, selected_button, 36, bg_color=(200, 200, 200))
 
@@ -102,13 +149,26 @@ def set_clocks(time: str):
             raise ValueError(f"There is no such time control in our game {time}!")
 
 
+def get_increment(time: str) -> int:
+    """
+    :param time: Time control as the menu buttons show it: "<minutes> + <increment seconds>".
+    :return: The increment in seconds.
+    """
+    if not isinstance(time, str):
+        raise TypeError(f"Parameter time should be the type of str not {type(time)}.")
+    minutes, separator, increment = time.partition("+")
+    if not separator or not increment.strip().isdigit():
+        raise ValueError(f"There is no such time control in our game {time}!")
+    return int(increment)
+
+
 def switch_clocks():
     global is_white_on_turn, white_clock, black_clock
     if is_white_on_turn:
-        black_clock.stop()
+        black_clock.stop(add_increment=True)
         white_clock.start()
     else:
-        white_clock.stop()
+        white_clock.stop(add_increment=True)
         black_clock.start()
 
 
@@ -117,8 +177,13 @@ toggle_music_button = ToggleButton(300, 0, 200, 65, (200, 200, 200), "Turn music
                                    'music/Chess_Game.mp3')
 toggle_music_button.set_text("Turn music on/off")
 
+thinking_text = Text(board.start_x, board.start_y + 8 * graphics.SQUARE_SIZE + 10, "Thinking…", 30,
+                     pygame.Color(0, 20, 20), False)
+save_error_text = Text(board.start_x, board.start_y + 8 * graphics.SQUARE_SIZE + 45, "", 20, pygame.Color(200, 0, 0),
+                       False)
 white_material_text = Text(900, 770, "0", 40, pygame.Color(255, 0, 0), True)
 black_material_text = Text(900, 50, "0", 40, pygame.Color(255, 0, 0), True)
+shown_material_balance: Optional[int] = None  # The balance the material texts were last rendered with.
 
 
 def application():
@@ -131,41 +196,98 @@ def application():
 
     running = True
     while running:
-        clock.tick(FPS)
+        if is_dragging():
+            clock.tick(FPS)
+            events = pygame.event.get()
+        else:
+            events = wait_for_events()
         # pygame.mouse.set_cursor(pygame.SYSTEM_CURSOR_ARROW)
-        for event in pygame.event.get():
+        for event in events:
             if event.type == pygame.QUIT:
                 running = False
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
                     running = False
+                elif event.key == pygame.K_SPACE and CURRENT_SCREEN == "Game":
+                    play_computer_move_now()
+            elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                screen_regions.invalidate()
+            elif event.type == SAVE_ERROR_EVENT:
+                show_save_errors()
 
             if CURRENT_SCREEN == "Menu":
                 menu_event_handler(event)
             elif CURRENT_SCREEN == "Game":
                 game_event_handler(event)
 
+        dirty_rects = []
         if CURRENT_SCREEN == "Menu":
-            menu_screen(screen)
+            dirty_rects = menu_screen(screen)
         elif CURRENT_SCREEN == "Game":
-            game_screen(screen)
+            poll_computer_move()
+            dirty_rects = game_screen(screen)
 
-        pygame.display.update()
+        if dirty_rects:
+            pygame.display.update(dirty_rects)
 
+    cancel_computer_move()
+    if journal_writer is not None:
+        journal_writer.close()
     pygame.quit()
     exit()
 
 
-def menu_screen(screen):
+def is_dragging() -> bool:
+    return selected_piece_group.sprite is not None
+
+
+def wait_for_events() -> List[pygame.event.Event]:
+    """
+    Sleeps until an event arrives (input, the computer's move) or a running clock has to show the next second.
+    :return: The arrived events, empty on timeout.
+    """
+    timeout = IDLE_TIMEOUT
+    if CURRENT_SCREEN == "Game":
+        for game_clock in (white_clock, black_clock):
+            if game_clock.active:
+                timeout = min(timeout, math.ceil(game_clock.time_to_next_second() * 1000) + 1)
+
+    event = pygame.event.wait(timeout)
+    if event.type == pygame.NOEVENT:
+        return []
+    return [event] + pygame.event.get()
+
+
+def menu_screen(screen) -> List[pygame.Rect]:
+    """
+    Redraws the changed parts of the menu.
+    :return: The redrawn areas of the screen.
+    """
+    regions = {}
+    for button in menu_buttons:
+        regions[id(button)] = button.get_region()
+    for text in menu_texts:
+        regions[id(text)] = text.get_region()
+    regions[id(fen_input)] = fen_input.get_region()
+
+    dirty_rects = screen_regions.collect(screen, regions)
+    graphics.draw_regions(screen, dirty_rects, BACKGROUND_COLOR, draw_menu)
+    return dirty_rects
+
+
+def draw_menu(screen):
     for button in menu_buttons:
         button.draw(screen)
 
     for text in menu_texts:
         text.draw(screen)
 
+    fen_input.draw(screen)
+
 
 def menu_event_handler(event):
     global selected_button
+    fen_input.handle_event(event)
     if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
         mouse_pos = pygame.mouse.get_pos()
         for btn in menu_buttons:
@@ -175,8 +297,9 @@ def menu_event_handler(event):
                 if btn in time_buttons:
                     selected_button = set_clocks(btn.text.text)
                     new_time = set_clocks(btn.text.text)
-                    white_clock.set_time(new_time)
-                    black_clock.set_time(new_time)
+                    increment = get_increment(btn.text.text)
+                    white_clock.set_time(new_time, increment, CLOCK_DELAY)
+                    black_clock.set_time(new_time, increment, CLOCK_DELAY)
                     for other_btn in time_buttons:
                         if other_btn != btn:
                             other_btn.selected = False
@@ -187,18 +310,65 @@ def menu_event_handler(event):
                             other_btn.selected = False
                             other_btn.background_color = (72, 245, 66)
                 if btn == start_button:
-                    global CURRENT_SCREEN
-                    CURRENT_SCREEN = "Game"
-                    white_clock.start()
+                    start_game()
                 break
 
 
-def game_screen(screen):
+def start_game():
+    global CURRENT_SCREEN
+    global human_is_white, is_computer_opponent
+
+    fen = fen_input.text.strip()
+    if fen:
+        try:
+            setup_pieces(fen)
+        except ValueError as e:
+            fen_error_text.set_text(str(e))
+            fen_error_text.is_visible = True
+            return
+    fen_error_text.is_visible = False
+
+    human_is_white = not black_button.selected
+    is_computer_opponent = computer_button.selected
+    if human_is_white == is_board_turned:
+        graphics.turn_board(turn_board_button)
+
+    CURRENT_SCREEN = "Game"
+    screen_regions.invalidate()
+    (white_clock if pieces.position.white_to_move else black_clock).start()
+    computer_move()
+
+
+def game_screen(screen) -> List[pygame.Rect]:
+    """
+    Updates the game state shown on the screen and redraws only its changed parts.
+    :return: The redrawn areas of the screen.
+    """
     pieces_group.update()
     selected_piece_group.update()
 
-    screen.fill(BACKGROUND_COLOR)
+    # teszt
+    update_material_texts()
+    # teszt
+
+    if CURRENT_SCREEN == "Game":
+        white_clock.update()
+        black_clock.update()
 
+    regions = {}
+    for widget in game_buttons + game_texts + [board, move_list, toggle_music_button, thinking_text, save_error_text,
+                                                white_material_text, black_material_text, white_clock, black_clock]:
+        regions[id(widget)] = widget.get_region()
+    dragged_piece = selected_piece_group.sprite
+    regions["dragged piece"] = (pygame.Rect(0, 0, 0, 0) if dragged_piece is None else dragged_piece.rect,
+                                id(dragged_piece))
+
+    dirty_rects = screen_regions.collect(screen, regions)
+    graphics.draw_regions(screen, dirty_rects, BACKGROUND_COLOR, draw_game)
+    return dirty_rects
+
+
+def draw_game(screen):
     for button in game_buttons:
         button.draw(screen)
 
@@ -211,18 +381,13 @@ def game_screen(screen):
     toggle_music_button.draw(screen)
 
     # teszt
-    balance = calculate_material_balance()
-    white_material_text.set_text(f"Piece Evaluation: {max(balance, 0)}")  # Pozitív értékek, ha fehér előnyben
-    black_material_text.set_text(f"Piece Evaluation: {-min(balance, 0)}")  # Negatív értékek, ha fekete előnyben
-
-    white_material_text.draw(screen)  # Minden képkockafrissítéskor meghívandó
+    thinking_text.draw(screen)
+    save_error_text.draw(screen)
+    white_material_text.draw(screen)
     black_material_text.draw(screen)
     # teszt
 
     if CURRENT_SCREEN == "Game":
-        delta_time = pygame.time.Clock().tick(FPS) / 1000
-        white_clock.update(delta_time)
-        black_clock.update(delta_time)
         white_clock.draw(screen)
         black_clock.draw(screen)
 
@@ -231,8 +396,8 @@ def game_event_handler(event):
     global selected_piece
     mouse_x, mouse_y = pygame.mouse.get_pos()
 
-    mouse_row = (mouse_y - board.start_y) // board.square_size
-    mouse_col = (mouse_x - board.start_x) // board.square_size
+    mouse_row, mouse_col = graphics.view_row_col((mouse_y - board.start_y) // board.square_size,
+                                                 (mouse_x - board.start_x) // board.square_size)
     move_list.handle_event(event)  # hozzáadott, nem biztos, hogy jó.
 
     if event.type == pygame.MOUSEBUTTONDOWN:
@@ -326,6 +491,8 @@ def select_piece(mouse_row, mouse_col) -> None:
     global selected_piece
 
     selected_piece = pieces.find_piece(mouse_row, mouse_col)
+    if selected_piece is not None and is_computer_piece(selected_piece):
+        selected_piece = None  # The computer moves its own pieces, even while it is thinking.
     if selected_piece is not None:
         selected_piece.start_drag()
         board.legal_move_marks = None
@@ -343,16 +510,13 @@ def promotion_tab_click_control() -> None:
             isinstance(selected_piece, pieces.Pawn):
         selected_piece.promote(board.promotion_tab.get_clicked_piece_name())
 
-        last_move = ((before_promotion_row, before_promotion_col), (selected_piece.row, selected_piece.col))
+        last_move = pieces.position.last_move
 
         before_promotion_row, before_promotion_col = None, None
         before_promotion_taken_piece = None
 
-        is_white_on_turn = not is_white_on_turn
-        if is_mate(get_king()):
-            lose()
-        if not pieces.mating_force():
-            draw()
+        end_turn()
+        computer_move()
     else:
         cancel_promotion()
 
@@ -361,50 +525,126 @@ def promotion_tab_click_control() -> None:
     board.legal_move_marks = None
 
 
+def is_computer_piece(piece: pieces.Piece) -> bool:
+    return is_computer_opponent and piece.is_white != human_is_white
+
+
 def move_with_selected_piece(mouse_row, mouse_col) -> None:
     global is_white_on_turn
     global selected_piece
     global last_move
 
+    if is_computer_piece(selected_piece):
+        raise ValueError("The computer's pieces can not be moved!")
+
     before_move_row, before_move_col = selected_piece.row, selected_piece.col
     before_take_piece = pieces.find_piece(mouse_row, mouse_col)
 
-    splitted_info = selected_piece.info().split(":")
     selected_piece.move_to(mouse_row, mouse_col)
-    move_list.add_text(f"{splitted_info[0]}. {mouse_row}, {mouse_col}")
     if isinstance(selected_piece, pieces.Pawn) and selected_piece.row == selected_piece.last_row():
         begin_promotion(mouse_col, before_move_row, before_move_col, before_take_piece)
-    elif isinstance(selected_piece, pieces.King):
-        bal_bastya = pieces.find_piece(selected_piece.row, 0)
-        jobb_bastya = pieces.find_piece(selected_piece.row, 7)
-        if isinstance(jobb_bastya, pieces.Rook) and selected_piece.row == before_move_row and (
-                selected_piece.col == before_move_col + 2):
-            jobb_bastya.put(jobb_bastya.row, jobb_bastya.col - 2)
-            jobb_bastya.moved = True
-        if isinstance(bal_bastya, pieces.Rook) and selected_piece.row == before_move_row and (
-                selected_piece.col == before_move_col - 2):
-            bal_bastya.put(bal_bastya.row, bal_bastya.col + 3)
-            selected_piece.moved = True
-        if isinstance(selected_piece, pieces.Rook):
-            selected_piece.moved = True
-        selected_piece.moved = True
-        is_white_on_turn = not is_white_on_turn
-        if is_mate(get_king()):
-            lose()
-        if not pieces.mating_force():
-            draw()
     else:
-        last_move = ((before_move_row, before_move_col), (mouse_row, mouse_col))
+        last_move = pieces.position.last_move
         selected_piece = None
         board.legal_move_marks = None
-        is_white_on_turn = not is_white_on_turn
-        if is_mate(get_king()):
-            lose()
-        if not pieces.mating_force():
-            draw()
+        end_turn()
+        computer_move()
+
+
+def end_turn() -> None:
+    """
+    Common steps after every completed move: passes the turn, checks the end of the game and switches the clocks
+    while the game goes on.
+    """
+    global is_white_on_turn
+
+    record_move()
+    is_white_on_turn = pieces.position.white_to_move
+    king = get_king()
+    if is_mate(king):
+        lose()
+    elif is_stalemate(king) or not pieces.mating_force():
+        draw()
+    else:
+        save_game("*")
+    if not is_game_over:
         switch_clocks()
 
 
+def record_move() -> None:
+    """
+    Adds the last move of the position to the game record and to the move list, in SAN.
+    """
+    position = pieces.position
+    move = position.unmake_move()  # SAN depends on the position before the move.
+    san = notation.move_to_san(position, move)
+    move_number, is_white_move = position.fullmove_number, position.white_to_move
+    position.make_move(move)
+
+    game_moves.append(move)
+    move_list.add_text(f"{move_number}. {san}" if is_white_move else f"{move_number}... {san}")
+
+
+def computer_move() -> None:
+    """
+    Starts the search of the computer opponent in the background, if it is on turn. The move is played by
+    poll_computer_move when the search is finished.
+    """
+    if not is_computer_opponent or is_game_over or pieces.position.white_to_move == human_is_white:
+        return
+
+    computer_worker.start(pieces.position)
+    thinking_text.is_visible = True
+
+
+def cancel_computer_move() -> None:
+    """
+    Stops the search of the computer opponent, without playing its move.
+    """
+    computer_worker.cancel()
+    thinking_text.is_visible = False
+
+
+def play_computer_move_now() -> None:
+    """
+    Stops the search of the computer opponent and plays the best move found so far.
+    """
+    if computer_worker.is_thinking:
+        computer_worker.stop()
+
+
+def poll_computer_move() -> None:
+    """
+    Plays the move of the computer opponent if its search has finished. Called every frame, never waits.
+    """
+    global last_move, selected_piece
+
+    result = computer_worker.poll(pieces.position)
+    if result is None:
+        return
+    thinking_text.is_visible = False
+
+    print(f"Computer: depth {result.depth}, score {result.score}, {result.nodes} nodes, {result.elapsed:.2f} s.")
+    if result.best_move is None or is_game_over:
+        return
+
+    # Only a legal move of the current position is played, never a stale result.
+    move = pieces.position.find_move(*rules.decode_move(result.best_move))
+    piece = None if move is None else pieces.find_piece(*pieces.to_row_col(rules.move_from_square(move)))
+    if piece is None:
+        print(f"Computer's move {rules.move_to_uci(result.best_move)} is not legal in the current position.")
+        return
+    piece.perform_move(move)
+    last_move = move
+    if selected_piece is not None and selected_piece not in pieces.pieces_list:
+        # The human held a piece that the computer has just captured. (Not end_drag(), it would draw it again.)
+        selected_piece.is_dragged = False
+        selected_piece_group.remove(selected_piece)
+        selected_piece = None
+        board.legal_move_marks = None
+    end_turn()
+
+
 def begin_promotion(promotion_col, before_move_row, before_move_col, before_take_piece: Optional[pieces.Pawn]) -> None:
     global before_promotion_row, before_promotion_col, before_promotion_taken_piece
 
@@ -421,8 +661,7 @@ def cancel_promotion() -> None:
     if selected_piece is None:
         raise TypeError("There must be a selected piece while promoting!")
 
-    selected_piece.row, selected_piece.col = before_promotion_row, before_promotion_col
-    selected_piece.update_rect()
+    selected_piece.put(before_promotion_row, before_promotion_col)
     before_promotion_row, before_promotion_col = None, None
 
     if before_promotion_taken_piece is not None:
@@ -448,7 +687,12 @@ def remove_piece_from_list(piece: pieces.Piece) -> None:
     piece.remove_from_list()
 
 
-def setup_pieces() -> None:
+def setup_pieces(fen: Optional[str] = None) -> None:
+    """
+    Sets up a new game. The sprites of the pieces are created by pieces.ensure_sprites() when they are first needed.
+    :param fen: The starting position in Forsyth-Edwards Notation. Optional: If not given, then the standard one.
+    :raises ValueError: If the FEN is invalid. Nothing is changed then.
+    """
     global selected_piece
     global pieces_group
     global selected_piece_group
@@ -457,44 +701,30 @@ def setup_pieces() -> None:
     global last_move
     global is_onturn_king_in_check
     global is_white_on_turn
+    global is_game_over
+    global start_fen, game_moves, game_id
 
+    new_position = rules.Position.from_fen(fen) if fen else rules.Position.initial()
+
+    cancel_computer_move()
     pieces_group = pygame.sprite.Group()
     pieces.pieces_list = []
+    pieces.rebuild_square_index()
 
-    is_white_on_turn = True
+    is_white_on_turn = new_position.white_to_move
     selected_piece = None
     selected_piece_group = pygame.sprite.GroupSingle()
     before_promotion_row, before_promotion_col = None, None
     before_promotion_taken_piece = None
-    last_move = None  # [[from row, from col], [to row, to col]]
+    last_move = None
     is_onturn_king_in_check = False
+    is_game_over = False
+    start_fen = new_position.to_fen()
+    game_moves = []
+    writer = get_journal_writer()
+    game_id = writer.next_game_id if writer is not None else 0
 
-    for i in range(8):
-        add_piece_to_list(pieces.Pawn(1, i, False))
-        add_piece_to_list(pieces.Pawn(6, i, True))
-
-    add_piece_to_list(pieces.Knight(0, 1, False))
-    add_piece_to_list(pieces.Knight(0, 6, False))
-    add_piece_to_list(pieces.Knight(7, 1, True))
-    add_piece_to_list(pieces.Knight(7, 6, True))
-
-    add_piece_to_list(pieces.Bishop(0, 2, False))
-    add_piece_to_list(pieces.Bishop(0, 5, False))
-    add_piece_to_list(pieces.Bishop(7, 2, True))
-    add_piece_to_list(pieces.Bishop(7, 5, True))
-
-    add_piece_to_list(pieces.Rook(0, 0, False))
-    add_piece_to_list(pieces.Rook(0, 7, False))
-    add_piece_to_list(pieces.Rook(7, 0, True))
-    add_piece_to_list(pieces.Rook(7, 7, True))
-
-    pieces.white_king = pieces.King(7, 4, True)
-    pieces.black_king = pieces.King(0, 4, False)
-    add_piece_to_list(pieces.white_king)
-    add_piece_to_list(pieces.black_king)
-
-    add_piece_to_list(pieces.Queen(0, 3, False))
-    add_piece_to_list(pieces.Queen(7, 3, True))
+    pieces.position = new_position
 
 
 def is_mate(king: Optional[pieces.King]) -> bool:
@@ -502,14 +732,23 @@ def is_mate(king: Optional[pieces.King]) -> bool:
         print("No king found.")
         return False
     in_check = king.is_in_check()
-    no_moves = len(
-        king.get_all_legal_moves()) == 0
-    print("összes legális lépés.", king.get_all_legal_moves())
-    print(f"Checking mate: in_check={in_check}, no_moves={no_moves}")
-    return in_check and no_moves
+    # Only searched in check, and only until the first move of any piece that gets out of it.
+    is_mated = in_check and not pieces.position.has_legal_move()
+    print(f"Checking mate: in_check={in_check}, mate={is_mated}")
+    return is_mated
+
+
+def is_stalemate(king: Optional[pieces.King]) -> bool:
+    """
+    :return: True if the side on turn is not in check, but none of its pieces has a legal move.
+    """
+    if king is None:
+        return False
+    return not king.is_in_check() and not pieces.position.has_legal_move()
 
 
 def get_king() -> Optional[pieces.King]:
+    pieces.ensure_sprites()
     for piece in pieces.pieces_list:
         if isinstance(piece, pieces.King) and (piece.is_white == is_white_on_turn):
             print(f"King found: {piece}")
@@ -521,11 +760,21 @@ def get_king() -> Optional[pieces.King]:
 win_text = Text(135, 150, "You won the game!", 25, pygame.Color(0, 20, 20), True)
 
 
-def lose():
+def lose(is_white_loser: Optional[bool] = None):
+    """
+    Ends the game with a win.
+    :param is_white_loser: Color of the losing side. Optional: If not given, then the side to move (it is mated).
+    """
+    global is_game_over
+    if is_white_loser is None:
+        is_white_loser = is_white_on_turn
+    is_game_over = True
+    cancel_computer_move()
     print("Nyertél!")
-    result_text = "White won the game!" if not is_white_on_turn else "Black won the game!"
-    save_game_result(result_text)
-    if not is_white_on_turn:
+    white_clock.stop()
+    black_clock.stop()
+    save_game_result("1-0" if not is_white_loser else "0-1")
+    if not is_white_loser:
         win_text.set_text("White won the game!", 'Comic_sans')
         game_texts.append(win_text)
     else:
@@ -538,38 +787,101 @@ draw_text = Text(750, 50, "Draw!", 25, pygame.Color(0, 20, 20), True)
 
 
 def draw():
+    global is_game_over
+    is_game_over = True
+    cancel_computer_move()
     print("Döntetlen!")
     white_clock.stop()
     black_clock.stop()
     draw_text.set_text("Draw!", 'Comic_sans')
     game_texts.append(draw_text)
-    save_game_result("Draw!")
+    save_game_result("1/2-1/2")
 
 
-game_count = 0
-
-
-def save_game_result(result_message):
-    global game_count
-    filename = f'games/game_result_{game_count}.txt'
-    with open(filename, 'w', encoding='utf-8') as file:
-        for text, surface in move_list.texts:
-            file.write(text + '\n')
-        file.write(result_message + '\n')
+def save_game_result(result: str) -> None:
+    """
+    Saves the finished game and clears the move list.
+    :param result: One of pgn.RESULTS, except '*'.
+    """
+    save_game(result)
 
     move_list.texts.clear()
     move_list.first_addition = True
 
-    game_count += 1
+
+def save_game(result: str) -> None:
+    """
+    Appends the game in PGN to the journal, as finished unless the result is '*' (in progress).
+    """
+    writer = get_journal_writer()
+    if writer is None:
+        return  # The error is already shown.
+    text = io.StringIO()
+    pgn.write_game(text, game_moves, result, start_fen, get_game_headers())
+    writer.append(game_id, result != "*", text.getvalue())
+
+
+def get_journal_writer() -> Optional[journal.JournalWriter]:
+    """
+    Opens the journal of the games at the first call.
+    :return: The writer of the journal, or None if it could not be opened. (The error is shown, see show_save_error.)
+    """
+    global journal_writer, journal_open_error
+
+    if journal_writer is None and journal_open_error is None:
+        try:
+            journal_writer = journal.JournalWriter(
+                journal.open_journal(GAME_JOURNAL_PATH),
+                on_error=lambda: pygame.event.post(pygame.event.Event(SAVE_ERROR_EVENT)))
+        except OSError as error:
+            journal_open_error = error
+            show_save_error(error)
+    return journal_writer
+
+
+def show_save_errors() -> None:
+    """
+    Shows the last error of the journal writer, if saving a game has failed since the last call.
+    """
+    errors = journal_writer.poll_errors() if journal_writer is not None else []
+    if errors:
+        show_save_error(errors[-1])
+
+
+def show_save_error(error: Exception) -> None:
+    print(f"Saving the game failed: {error}")
+    save_error_text.set_text(f"Saving the game failed: {error}")
+    save_error_text.is_visible = True
+
+
+def get_game_headers() -> Dict[str, str]:
+    """
+    :return: The PGN tags describing the game (except the result and the starting position).
+    """
+    human = "Human"
+    opponent = "Computer" if is_computer_opponent else "Human"
+    return {
+        'Event': "Casual game",
+        'Date': pgn.format_date(date.today()),
+        'White': human if human_is_white else opponent,
+        'Black': opponent if human_is_white else human,
+        'TimeControl': f"{white_clock.initial_time}+{white_clock.increment}",
+    }
 
 
 def calculate_material_balance():
-    white_score = 0
-    black_score = 0
-    for piece in pieces.pieces_list:
-        piece_value = pieces.piece_values[type(piece).__name__]
-        if piece.is_white:
-            white_score += piece_value
-        else:
-            black_score += piece_value
-    return white_score - black_score
+    return pieces.position.material
+
+
+def update_material_texts() -> None:
+    """
+    Re-renders the material texts, but only if the balance has changed since the last time.
+    """
+    global shown_material_balance
+
+    balance = calculate_material_balance()
+    if balance == shown_material_balance:
+        return
+    shown_material_balance = balance
+    white_material_text.set_text(f"Piece Evaluation: {max(balance, 0)}")  # Pozitív értékek, ha fehér előnyben
+    black_material_text.set_text(f"Piece Evaluation: {-min(balance, 0)}")  # Negatív értékek, ha fekete előnyben
@@ -0,0 +1,87 @@
+from collections import OrderedDict
+
+import pygame
+from typing import Dict, Optional, Tuple
+
+"""
+Contains the shared image, font and rendered text caches. (Every piece picture is loaded and scaled, every font is
+looked up only once per process.)
+"""
+
+# (is_white, piece name, size) -> (scaled surface, was it converted to the display format)
+_piece_images: Dict[Tuple[bool, str, int], Tuple[pygame.Surface, bool]] = {}
+_square_size = None
+
+# (family, size) -> font. Family None is pygame's default font, anything else is looked up with SysFont.
+_fonts: Dict[Tuple[Optional[str], int], pygame.font.Font] = {}
+
+# (family, size, text, color) -> rendered surface, the least recently used is dropped above TEXT_CACHE_SIZE.
+TEXT_CACHE_SIZE = 512
+_rendered_texts: 'OrderedDict[Tuple[Optional[str], int, str, Tuple[int, int, int, int]], pygame.Surface]' = \
+    OrderedDict()
+
+
+def get_piece_image(is_white: bool, name: str, size: int) -> pygame.Surface:
+    """
+    Returns the shared, scaled picture of a piece. The returned surface must not be drawn on.
+    :param is_white: Color of the piece.
+    :param name: Name of the piece as Piece.__str__ returns it (e.g. 'Queen' or 'queen'), which is also the file name.
+    :param size: Width and height of the picture in pixels (the square size of the board).
+    :return: The cached surface.
+    """
+    global _square_size
+
+    if size != _square_size:
+        _piece_images.clear()
+        _square_size = size
+
+    key = (is_white, name, size)
+    image, converted = _piece_images.get(key, (None, False))
+    has_display = pygame.display.get_surface() is not None
+
+    if image is None:
+        image = pygame.image.load(f"images/{'white' if is_white else 'black'}/{name}.png")
+        image = pygame.transform.scale(image, (size, size))
+    if has_display and not converted:
+        # Converting needs a display mode, so pictures loaded before set_mode() are converted on a later call.
+        image = image.convert_alpha()
+        converted = True
+
+    _piece_images[key] = (image, converted)
+    return image
+
+
+def get_font(family: Optional[str], size: int) -> pygame.font.Font:
+    """
+    Returns the shared font, the system font lookup happens only at the first call.
+    :param family: System font name (e.g. 'arial'), or None for pygame's default font.
+    :param size: Font size in pixels.
+    """
+    key = (family, size)
+    font = _fonts.get(key)
+    if font is None:
+        font = pygame.font.Font(None, size) if family is None else pygame.font.SysFont(family, size)
+        _fonts[key] = font
+    return font
+
+
+def render_text(family: Optional[str], size: int, text: str, color) -> pygame.Surface:
+    """
+    Returns the shared, antialiased rendering of a text. The returned surface must not be drawn on.
+    :param family: System font name (e.g. 'arial'), or None for pygame's default font.
+    :param size: Font size in pixels.
+    :param text: The text to render.
+    :param color: Anything pygame.Color accepts.
+    :return: The cached surface.
+    """
+    key = (family, size, text, tuple(pygame.Color(color)))
+    surface = _rendered_texts.get(key)
+    if surface is not None:
+        _rendered_texts.move_to_end(key)
+        return surface
+
+    surface = get_font(family, size).render(text, True, color)
+    _rendered_texts[key] = surface
+    if len(_rendered_texts) > TEXT_CACHE_SIZE:
+        _rendered_texts.popitem(last=False)
+    return surface
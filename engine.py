@@ -0,0 +1,312 @@
+import queue
+import threading
+import time
+from typing import Callable, List, NamedTuple, Optional
+
+import rules
+from transposition import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+
+"""
+Contains the computer opponent: iterative deepening alpha-beta (negamax) search over the rules core.
+"""
+
+MATE_SCORE = 100000
+MATE_BOUND = MATE_SCORE - 1000  # Scores beyond this are mates, their distance is encoded in the score.
+INFINITY = 1000000
+
+# Centipawn values of the pieces, from rules.piece_values. The king is never captured, so it is not counted.
+PIECE_SCORES = {letter: (rules.piece_values[name] * 100 if letter != 'K' else 0)
+                for letter, name in rules.piece_names.items()}
+
+
+def evaluate(position: rules.Position) -> int:
+    """
+    Static evaluation: material and piece-square bonuses, kept up to date by the position itself.
+    :return: Score in centipawns from the side to move's point of view.
+    """
+    return position.score if position.white_to_move else -position.score
+
+
+class SearchResult(NamedTuple):
+    best_move: Optional[rules.Move]
+    score: int  # Centipawns from the side to move's point of view, or +-(MATE_SCORE - plies) for mates.
+    depth: int  # Last fully searched depth.
+    nodes: int
+    elapsed: float  # Seconds.
+
+
+class SearchStopped(Exception):
+    """Raised inside the search when the node budget or the time limit is used up."""
+
+
+class Engine:
+    """
+    Configurable by maximal depth, node budget and time limit, whichever is reached first. At least depth 1 is
+    always completed, so there is always a move to play.
+    """
+
+    def __init__(self, max_depth: int = 6, node_budget: Optional[int] = None, time_limit: Optional[float] = None,
+                 tt_memory_mb: float = 16):
+        if max_depth < 1:
+            raise ValueError(f"Max depth must be at least 1, got {max_depth}.")
+
+        self.max_depth = max_depth
+        self.node_budget = node_budget
+        self.time_limit = time_limit
+        self.tt = TranspositionTable(tt_memory_mb)
+
+        self.nodes = 0
+        self._start_time = 0.0
+        self._can_stop = False
+        self._stop_event: Optional[threading.Event] = None
+
+    def search(self, position: rules.Position, stop_event: Optional[threading.Event] = None) -> SearchResult:
+        """
+        Searches the best move of the side to move. The given position is not changed.
+        :param stop_event: If set from another thread, the search stops as soon as possible.
+        :return: The result of the deepest completed iteration. best_move is None if there is no legal move.
+        """
+        position = position.copy()
+        self.nodes = 0
+        self._start_time = time.perf_counter()
+        self._can_stop = False
+        self._stop_event = stop_event
+        self.tt.new_search()
+
+        moves = position.legal_moves()
+        if not moves:
+            return SearchResult(None, -MATE_SCORE if position.is_in_check() else 0, 0, 0, 0.0)
+
+        result = SearchResult(moves[0], 0, 0, 0, 0.0)
+        for depth in range(1, self.max_depth + 1):
+            try:
+                score, best_move = self._search_root(position, moves, depth)
+            except SearchStopped:
+                break
+            result = SearchResult(best_move, score, depth, self.nodes, time.perf_counter() - self._start_time)
+            self._can_stop = True
+
+            if abs(score) >= MATE_BOUND:
+                break
+            if self.time_limit is not None and result.elapsed > self.time_limit / 2:
+                break  # The next iteration would not finish in time anyway.
+        return result
+
+    def _search_root(self, position: rules.Position, moves: List[rules.Move], depth: int):
+        entry = self.tt.probe(position.hash)
+        moves = self._order_moves(position, moves, entry.best_move if entry is not None else None)
+
+        alpha, beta = -INFINITY, INFINITY
+        best_move = moves[0]
+        for move in moves:
+            position.make_move(move)
+            score = -self._negamax(position, depth - 1, -beta, -alpha, 1)
+            position.unmake_move()
+            if score > alpha:
+                alpha, best_move = score, move
+
+        self.tt.store(position.hash, depth, EXACT, alpha, best_move)
+        return alpha, best_move
+
+    def _negamax(self, position: rules.Position, depth: int, alpha: int, beta: int, ply: int) -> int:
+        self._count_node()
+
+        if position.halfmove_clock >= 100 or position.is_repetition():
+            return 0
+
+        original_alpha = alpha
+        tt_move = None
+        entry = self.tt.probe(position.hash)
+        if entry is not None:
+            tt_move = entry.best_move
+            if entry.depth >= depth:
+                score = score_from_tt(entry.score, ply)
+                if entry.bound == EXACT:
+                    return score
+                if entry.bound == LOWER_BOUND:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+                if alpha >= beta:
+                    return score
+
+        if depth <= 0:
+            return self._quiescence(position, alpha, beta, ply)
+
+        moves = position.legal_moves()
+        if not moves:
+            return -MATE_SCORE + ply if position.is_in_check() else 0
+
+        best_score, best_move = -INFINITY, None
+        for move in self._order_moves(position, moves, tt_move):
+            position.make_move(move)
+            score = -self._negamax(position, depth - 1, -beta, -alpha, ply + 1)
+            position.unmake_move()
+
+            if score > best_score:
+                best_score, best_move = score, move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+
+        if best_score <= original_alpha:
+            bound = UPPER_BOUND
+        elif best_score >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        self.tt.store(position.hash, depth, bound, score_to_tt(best_score, ply), best_move)
+        return best_score
+
+    def _quiescence(self, position: rules.Position, alpha: int, beta: int, ply: int) -> int:
+        """
+        Searches captures and promotions only, until the position is quiet, so the evaluation is not taken in the
+        middle of an exchange.
+        """
+        self._count_node()
+
+        stand_pat = evaluate(position)
+        if stand_pat >= beta:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+
+        captures = [move for move in position.legal_moves()
+                    if rules.move_flags(move) & (rules.MOVE_CAPTURE | rules.MOVE_PROMOTION)]
+        for move in self._order_moves(position, captures, None):
+            position.make_move(move)
+            score = -self._quiescence(position, -beta, -alpha, ply + 1)
+            position.unmake_move()
+            if score >= beta:
+                return score
+            alpha = max(alpha, score)
+        return alpha
+
+    @staticmethod
+    def _order_moves(position: rules.Position, moves: List[rules.Move],
+                     tt_move: Optional[rules.Move]) -> List[rules.Move]:
+        """
+        Best first: the move from the transposition table, then captures by most valuable victim and least
+        valuable attacker, then promotions, then quiet moves.
+        """
+        board = position.board
+
+        def order(move: rules.Move) -> int:
+            if move == tt_move:
+                return -INFINITY
+            victim = board[rules.move_to_square(move)]
+            score = 0
+            if victim is not None:
+                score -= 10 * PIECE_SCORES[victim.upper()] - PIECE_SCORES[board[rules.move_from_square(move)].upper()]
+            promotion = rules.move_promotion(move)
+            if promotion is not None:
+                score -= PIECE_SCORES[promotion]
+            return score
+
+        return sorted(moves, key=order)
+
+    def _count_node(self) -> None:
+        self.nodes += 1
+        if self._stop_event is not None and self.nodes & 255 == 0 and self._stop_event.is_set():
+            raise SearchStopped()
+        if not self._can_stop:
+            return
+        if self.node_budget is not None and self.nodes >= self.node_budget:
+            raise SearchStopped()
+        if self.time_limit is not None and self.nodes & 255 == 0 and \
+                time.perf_counter() - self._start_time >= self.time_limit:
+            raise SearchStopped()
+
+
+def score_to_tt(score: int, ply: int) -> int:
+    """
+    Mate scores are stored as distance from the stored position instead of from the root.
+    """
+    if score >= MATE_BOUND:
+        return score + ply
+    if score <= -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def score_from_tt(score: int, ply: int) -> int:
+    if score >= MATE_BOUND:
+        return score - ply
+    if score <= -MATE_BOUND:
+        return score + ply
+    return score
+
+
+class SearchWorker:
+    """
+    Runs the searches of an engine in a background thread, so the caller (the render loop) is never blocked.
+    Results are passed back through a queue, which is polled without waiting.
+    """
+
+    def __init__(self, engine: Engine, on_finished: Optional[Callable[[], None]] = None):
+        """
+        :param on_finished: Called from the search thread when a result is ready to poll, e.g. to wake up the caller.
+        """
+        self.engine = engine
+        self.on_finished = on_finished
+        self._results: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._search_id = 0
+        self._position_hash: Optional[int] = None  # Of the position the running search was started for.
+
+    @property
+    def is_thinking(self) -> bool:
+        return self._thread is not None
+
+    def start(self, position: rules.Position) -> None:
+        """
+        Starts searching the position in the background. A search that is still running is cancelled first.
+        :param position: Copied before the thread starts, so it can be changed right after this call.
+        """
+        self.cancel()
+        self._stop_event = threading.Event()
+        self._position_hash = position.hash
+        self._thread = threading.Thread(target=self._run, args=(position.copy(), self._stop_event, self._search_id),
+                                        name="engine-search", daemon=True)
+        self._thread.start()
+
+    def _run(self, position: rules.Position, stop_event: threading.Event, search_id: int) -> None:
+        result = self.engine.search(position, stop_event)
+        self._results.put((search_id, result))
+        if self.on_finished is not None:
+            self.on_finished()
+
+    def poll(self, position: Optional[rules.Position] = None) -> Optional[SearchResult]:
+        """
+        :param position: The current position. Optional: If given, a result searched for another position (the
+        position has changed since start()) is thrown away.
+        :return: The result of the running search if it has finished, otherwise None. Never blocks.
+        """
+        while True:
+            try:
+                search_id, result = self._results.get_nowait()
+            except queue.Empty:
+                return None
+            if search_id == self._search_id and self._thread is not None:
+                self._thread = None
+                if position is not None and position.hash != self._position_hash:
+                    return None
+                return result
+
+    def stop(self) -> None:
+        """
+        Asks the running search to finish early. Its result, the best move found so far, still arrives via poll.
+        """
+        self._stop_event.set()
+
+    def cancel(self) -> None:
+        """
+        Stops the running search, its result is thrown away. Waits for the thread, so the engine is free to use again.
+        """
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        self._search_id += 1
@@ -144,6 +144,103 @@ def get_all_legal_moves_king(x, y):
 
     return legal_moves_list
 
+
+def to_bitboard(squares) -> int:
+    """
+    :param squares: (row, col) pairs, the ones outside of the board are skipped.
+    :return: 64-bit int with the bit row * 8 + col set for every square.
+    """
+    bitboard = 0
+    for x, y in squares:
+        if 0 <= x <= 7 and 0 <= y <= 7:
+            bitboard |= 1 << (x * 8 + y)
+    return bitboard
+
+
+def split_to_rays(x, y, squares):
+    """
+    Splits the line pattern of a slider into one ray per direction.
+    :return: Dictionary (row step, col step) -> bitboard of the ray starting next to (x, y).
+    """
+    rays = {}
+    for a, b in squares:
+        direction = ((a > x) - (a < x), (b > y) - (b < y))
+        rays[direction] = rays.get(direction, 0) | to_bitboard([(a, b)])
+    return rays
+
+
+# Precomputed attack tables, indexed by square (row * 8 + col). Built once at import from the patterns above.
+KNIGHT_ATTACKS = [to_bitboard(get_all_legal_moves_knight(sq >> 3, sq & 7)) for sq in range(64)]
+KING_ATTACKS = [to_bitboard(get_all_legal_moves_king(sq >> 3, sq & 7)) for sq in range(64)]
+PAWN_ATTACKS = {
+    color: [to_bitboard(move for move in get_all_legal_moves_pawn(sq >> 3, sq & 7, color) if move[1] != sq & 7)
+            for sq in range(64)]
+    for color in (True, False)
+}
+ROOK_MASKS = [to_bitboard(get_all_legal_moves_rook(sq >> 3, sq & 7)) for sq in range(64)]
+BISHOP_MASKS = [to_bitboard(get_all_legal_moves_bishop(sq >> 3, sq & 7)) for sq in range(64)]
+
+# Rays of the sliders, per direction. Positive directions go towards higher bits (the first blocker is the lowest
+# set bit), negative directions towards lower bits (the first blocker is the highest set bit).
+ROOK_DIRECTIONS = ((0, 1), (1, 0), (0, -1), (-1, 0))
+BISHOP_DIRECTIONS = ((1, 1), (1, -1), (-1, 1), (-1, -1))
+RAYS = {direction: [0] * 64 for direction in ROOK_DIRECTIONS + BISHOP_DIRECTIONS}
+for _sq in range(64):
+    for _direction, _ray in split_to_rays(_sq >> 3, _sq & 7, get_all_legal_moves_queen(_sq >> 3, _sq & 7)).items():
+        RAYS[_direction][_sq] = _ray
+POSITIVE_ROOK_RAYS = (RAYS[(0, 1)], RAYS[(1, 0)])
+NEGATIVE_ROOK_RAYS = (RAYS[(0, -1)], RAYS[(-1, 0)])
+POSITIVE_BISHOP_RAYS = (RAYS[(1, 1)], RAYS[(1, -1)])
+NEGATIVE_BISHOP_RAYS = (RAYS[(-1, 1)], RAYS[(-1, -1)])
+
+# Squares strictly between two squares on a common line (0 if they are not on a line), indexed by a * 64 + b.
+BETWEEN = [0] * (64 * 64)
+for _sq in range(64):
+    for _rays in RAYS.values():
+        _ray = _rays[_sq]
+        _bits = _ray
+        while _bits:
+            _lowest = _bits & -_bits
+            _target = _lowest.bit_length() - 1
+            BETWEEN[_sq * 64 + _target] = _ray & ~_rays[_target] & ~_lowest
+            _bits ^= _lowest
+
+
+def sliding_attacks(sq: int, occupied: int, positive_rays, negative_rays) -> int:
+    attacks = 0
+    for rays in positive_rays:
+        ray = rays[sq]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= rays[(blockers & -blockers).bit_length() - 1]
+        attacks |= ray
+    for rays in negative_rays:
+        ray = rays[sq]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= rays[blockers.bit_length() - 1]
+        attacks |= ray
+    return attacks
+
+
+def rook_attacks(sq: int, occupied: int) -> int:
+    return sliding_attacks(sq, occupied, POSITIVE_ROOK_RAYS, NEGATIVE_ROOK_RAYS)
+
+
+def bishop_attacks(sq: int, occupied: int) -> int:
+    return sliding_attacks(sq, occupied, POSITIVE_BISHOP_RAYS, NEGATIVE_BISHOP_RAYS)
+
+
+def iterate_bits(bitboard: int):
+    """
+    Yields the index of every set bit, from the lowest one.
+    """
+    while bitboard:
+        lowest = bitboard & -bitboard
+        yield lowest.bit_length() - 1
+        bitboard ^= lowest
+
+
 # Test
 # print("Gyalog tesztelése: (5,5)")
 # print(get_all_legal_moves_pawn(5, 5))
@@ -1,9 +1,13 @@
 from datetime import datetime, timedelta
 
+import time
+
 import pygame
 import application as app
+import assets
 import pieces
-from typing import List
+import rules
+from typing import Dict, List, Optional, Tuple
 import sys
 
 """
@@ -36,11 +40,47 @@ class Board:
 
         self.legal_move_marks = None
 
+        # The squares and the coordinates are drawn only once, they change only when the board is turned or resized.
+        self._background: Optional[pygame.Surface] = None
+        self._coordinates: Optional[pygame.Surface] = None
+        self._background_key = None
+        self._rendered_state = None
+
+    def get_region(self) -> Tuple[pygame.Rect, tuple]:
+        """
+        :return: The area of the board on the screen and everything its picture depends on (see DirtyRegions).
+        """
+        pieces.ensure_sprites()
+        selected = app.selected_piece
+        if selected is not None and selected.is_white != app.is_white_on_turn:
+            selected = None
+        state = (app.is_board_turned, app.is_white_on_turn, self.square_size, app.last_move,
+                 None if selected is None else (id(selected), selected.row, selected.col),
+                 self.promotion_tab.is_visible, self.promotion_tab.start_x, self.promotion_tab.start_y,
+                 tuple((id(sprite.image), sprite.row, sprite.col) for sprite in app.pieces_group))
+        return self.board.get_rect(left=self.start_x, top=self.start_y), state
+
     def draw_board(self, screen):
+        self.render()
+
+        screen.blit(self.board, (self.start_x, self.start_y))
+
+        app.selected_piece_group.draw(screen)
+
+    def render(self):
+        """
+        Draws the squares, the marks and the pieces onto the board surface, if anything has changed since the last
+        time. (The dragged piece is drawn directly onto the screen by draw_board.)
+        """
+        state = self.get_region()[1]
+        if state == self._rendered_state:
+            return
+        self._rendered_state = state
+
         self.draw_squares()
         self.draw_board_marks()
 
-        app.pieces_group.draw(self.board)
+        self.draw_pieces()
 
         if app.selected_piece is not None and app.selected_piece.is_white == app.is_white_on_turn:
             if self.legal_move_marks is None:
@@ -52,28 +92,48 @@ class Board:
         if self.promotion_tab.is_visible:
             self.promotion_tab.draw(self.board)
 
-        screen.blit(self.board, (self.start_x, self.start_y))
+    def draw_background(self):
+        """
+        Pre-renders the squares and the coordinates for the current orientation and square size.
+        """
+        self._background_key = (app.is_board_turned, self.square_size)
+        self._background = pygame.Surface(self.board.get_size())
+        self._coordinates = pygame.Surface(self.board.get_size(), pygame.SRCALPHA)
 
-        app.selected_piece_group.draw(screen)
-
-    def draw_squares(self):
         square = pygame.Rect(0, 0, self.square_size, self.square_size)
         for i in range(self.board_cols):
             for j in range(self.board_rows):
                 square.left, square.top = i * self.square_size, j * self.square_size
-                pygame.draw.rect(self.board, self.white_color if (i + j) % 2 == 0 else self.dark_color, square)
+                pygame.draw.rect(self._background, self.white_color if (i + j) % 2 == 0 else self.dark_color, square)
+
+        j = 0
+        iteration = range(8) if not app.is_board_turned else range(7, -1, -1)
+        for i in iteration:
+            rendered_text = assets.render_text("arial", 24, chr(49 + (7 - i)), (50, 50, 50))
+            self._coordinates.blit(rendered_text, (2, j * self.square_size + self.square_size // 2))
+
+            rendered_text = assets.render_text("arial", 26, chr(97 + i), (50, 50, 50))
+            self._coordinates.blit(rendered_text, (j * self.square_size + 71, 8 * self.square_size - 34))
+
+            j += 1
+
+    def draw_squares(self):
+        if self._background_key != (app.is_board_turned, self.square_size):
+            self.draw_background()
+        self.board.blit(self._background, (0, 0))
+
+        square = pygame.Rect(0, 0, self.square_size, self.square_size)
 
         if app.selected_piece is not None and app.selected_piece.is_white == app.is_white_on_turn:
-            square.left = app.selected_piece.col * self.square_size
-            square.top = app.selected_piece.row * self.square_size
+            row, col = view_row_col(app.selected_piece.row, app.selected_piece.col)
+            square.left, square.top = col * self.square_size, row * self.square_size
             pygame.draw.rect(self.board, self.selected_piece_square_color, square)
 
         if app.last_move is not None:
-            square.left, square.top = app.last_move[0][1] * self.square_size, app.last_move[0][0] * self.square_size
-            pygame.draw.rect(self.board, self.last_move_marker_color, square)
-
-            square.left, square.top = app.last_move[1][1] * self.square_size, app.last_move[1][0] * self.square_size
-            pygame.draw.rect(self.board, self.last_move_marker_color, square)
+            for move_square in rules.decode_move(app.last_move)[:2]:
+                row, col = view_row_col(*pieces.to_row_col(move_square))
+                square.left, square.top = col * self.square_size, row * self.square_size
+                pygame.draw.rect(self.board, self.last_move_marker_color, square)
 
         # if app.is_onturn_king_in_check:
         #     if app.is_white_on_turn:
@@ -86,23 +146,16 @@ class Board:
         #         pygame.draw.rect(self.board, self.check_marker_color, square, 3)
 
     def draw_board_marks(self):
-        numbers_font = pygame.font.SysFont("arial", 24)
-        letters_font = pygame.font.SysFont("arial", 26)
+        self.board.blit(self._coordinates, (0, 0))
 
-        j = 0
-        iteration = range(8) if not app.is_board_turned else range(7, -1, -1)
-        for i in iteration:
-            rendered_text = numbers_font.render(chr(49 + (7 - i)), True, (50, 50, 50))
-            self.board.blit(rendered_text, (2, j * self.square_size + self.square_size // 2))
-
-            rendered_text = letters_font.render(chr(97 + i), True, (50, 50, 50))
-            self.board.blit(rendered_text, (j * self.square_size + 71, 8 * self.square_size - 34))
-
-            j += 1
+    def draw_pieces(self):
+        for sprite in app.pieces_group:
+            row, col = view_row_col(sprite.row, sprite.col)
+            self.board.blit(sprite.image, (col * self.square_size, row * self.square_size))
 
     def draw_legal_moves_marks(self) -> None:
         for legal_move in self.legal_move_marks:
-            move_row, move_col = legal_move[0], legal_move[1]
+            move_row, move_col = view_row_col(legal_move[0], legal_move[1])
 
             pygame.draw.circle(self.board, self.legal_move_marker_color,
                                (move_col * self.square_size + self.square_size // 2,
@@ -151,31 +204,30 @@ class PromotionTab:
         self.background_color = pygame.Color((10, 128, 10))
 
         self._visible = False
+        self.promotion_col = 0
 
-        self.white_images: List[pygame.image] = list()
-        self.white_images.append(pygame.image.load('images/white/Queen.png'))
-        self.white_images.append(pygame.image.load('images/white/Knight.png'))
-        self.white_images.append(pygame.image.load('images/white/Rook.png'))
-        self.white_images.append(pygame.image.load('images/white/Bishop.png'))
-
-        self.black_images: List[pygame.image] = list()
-        self.black_images.append(pygame.image.load('images/black/bishop.png'))
-        self.black_images.append(pygame.image.load('images/black/rook.png'))
-        self.black_images.append(pygame.image.load('images/black/knight.png'))
-        self.black_images.append(pygame.image.load('images/black/queen.png'))
+        # Loaded from the shared image cache when drawn, in the order of the tab.
+        self.white_images: List[str] = ['Queen', 'Knight', 'Rook', 'Bishop']
+        self.black_images: List[str] = ['bishop', 'rook', 'knight', 'queen']
 
     @property
     def is_visible(self):
         return self._visible
 
     def set_visible(self, promotion_col: int):
+        """
+        Shows the tab over the promotion square, on the side of the board where the pawn promotes.
+        :param promotion_col: Column of the promotion square from white's side.
+        """
         if not isinstance(promotion_col, int):
             raise TypeError(f"Parameter promotion_col must be integer.")
 
         self._visible = True
+        self.promotion_col = promotion_col
 
-        self.start_x = promotion_col * SQUARE_SIZE
-        self.global_x = BOARD_START_X + promotion_col * SQUARE_SIZE
+        display_col = view_row_col(0, promotion_col)[1]
+        self.start_x = display_col * SQUARE_SIZE
+        self.global_x = BOARD_START_X + display_col * SQUARE_SIZE
         if app.is_white_on_turn is not app.is_board_turned:
             self.start_y = 0
             self.global_y = BOARD_START_Y + 0
@@ -210,7 +262,8 @@ class PromotionTab:
         iteration = range(4) if not app.is_board_turned else range(3, -1, -1)
         position = 0
         for i in iteration:
-            self.tab.blit(images[i], (0, position * SQUARE_SIZE))
+            image = assets.get_piece_image(app.is_white_on_turn, images[i], SQUARE_SIZE)
+            self.tab.blit(image, (0, position * SQUARE_SIZE))
             position += 1
 
     def draw(self, screen):
@@ -277,6 +330,10 @@ class Button:
     def get_end_pos(self):
         return self.start_x + self.width, self.start_y + self.height
 
+    def get_region(self) -> Tuple[pygame.Rect, tuple]:
+        return (pygame.Rect(self.start_x, self.start_y, self.width, self.height),
+                (self.is_visible, id(self.button), self.text.text, tuple(pygame.Color(self.background_color))))
+
     def set_text(self, text):
         self.button.fill(self.background_color)
 
@@ -311,8 +368,7 @@ class Text:
         if not isinstance(text, str):
             raise ValueError("Text must be a string type")
         self.text = text
-        font_style = pygame.font.SysFont(font_style, self.text_size)
-        self.rendered_text = font_style.render(self.text, True, self.text_color)
+        self.rendered_text = assets.render_text(font_style, self.text_size, self.text, self.text_color)
 
         self.width, self.height = self.rendered_text.get_width(), self.rendered_text.get_height()
 
@@ -320,6 +376,10 @@ class Text:
         self.start_x = (screen.get_width() - self.width) // 2
         self.start_y = (screen.get_height() - self.height) // 2
 
+    def get_region(self) -> Tuple[pygame.Rect, tuple]:
+        return (pygame.Rect(self.start_x, self.start_y, self.width, self.height),
+                (self.is_visible, self.text, id(self.rendered_text)))
+
     def draw(self, screen: pygame.Surface):
         if self.is_visible:
             screen.blit(self.rendered_text, (self.start_x, self.start_y))
@@ -328,45 +388,99 @@ class Text:
 class Clock(object):
     """
     a grafikai kinézetét fogja tartalamazni.
+    The time is measured between time.perf_counter() timestamps taken when the clock is started and stopped, so it
+    does not depend on how often the frames are drawn.
     """
 
-    def __init__(self, x, y, width, height, initial_time, font_size=20, bg_color=(200, 200, 200), text_color=(0, 0, 0)):
+    def __init__(self, x, y, width, height, initial_time, font_size=20, bg_color=(200, 200, 200), text_color=(0, 0, 0),
+                 increment=0, delay=0):
         self.x = x
         self.y = y
         self.width = width
         self.height = height
         self.initial_time = initial_time
-        self.remaining_time = self.initial_time
-        self.font = pygame.font.SysFont('arial', font_size)
+        self.increment = increment  # Seconds added after every move (Fischer increment).
+        self.delay = delay  # Seconds at the start of every turn which are not counted (simple delay).
+        self._remaining_time = self.initial_time  # At the last stop.
+        self._started_at: Optional[float] = None  # Timestamp of the start of the running turn.
+        self.font_size = font_size
         self.bg_color = bg_color
         self.text_color = text_color
         self.rect = pygame.Rect(x, y, width, height)
-        self.active = False
 
-    def set_time(self, new_time):
+    @property
+    def active(self) -> bool:
+        return self._started_at is not None
+
+    @property
+    def remaining_time(self) -> float:
+        return self.get_remaining_time(time.perf_counter())
+
+    def get_remaining_time(self, now: float) -> float:
+        """
+        :param now: time.perf_counter() timestamp.
+        :return: Remaining seconds at the given moment, never negative.
+        """
+        if self._started_at is None:
+            return self._remaining_time
+        used = max(now - self._started_at - self.delay, 0)
+        return max(self._remaining_time - used, 0)
+
+    def set_time(self, new_time, increment=None, delay=None):
         self.initial_time = new_time
-        self.remaining_time = new_time
+        self._remaining_time = new_time
+        if increment is not None:
+            self.increment = increment
+        if delay is not None:
+            self.delay = delay
+        if self.active:
+            self._started_at = time.perf_counter()
 
     def start(self):
-        self.active = True
+        if not self.active:
+            self._started_at = time.perf_counter()
+
+    def stop(self, add_increment: bool = False):
+        """
+        :param add_increment: True when the turn ended with a move, so the increment is added.
+        """
+        if not self.active:
+            return
+        self._remaining_time = self.get_remaining_time(time.perf_counter())
+        self._started_at = None
+        if add_increment and self._remaining_time > 0:
+            self._remaining_time += self.increment
+
+    def update(self):
+        """
+        Stops the clock when the time is up.
+        """
+        if self.active and self.remaining_time <= 0:
+            self.stop()
+
+    def time_to_next_second(self) -> float:
+        """
+        :return: Seconds until the shown time changes, if the clock is running.
+        """
+        now = time.perf_counter()
+        to_next_second = self.get_remaining_time(now) % 1 or 1.0
+        if self.active:
+            to_next_second += max(self._started_at + self.delay - now, 0)
+        return to_next_second
 
-    def stop(self):
-        self.active = False
+    def get_time_text(self) -> str:
+        minutes = int(self.remaining_time // 60)
+        seconds = int(self.remaining_time % 60)
+        return f"{minutes:02}:{seconds:02}"
 
-    def update(self, dt):
-        if self.active:
-            self.remaining_time -= dt
-            if self.remaining_time <= 0:
-                self.remaining_time = 0
-                self.active = False
+    def get_region(self) -> Tuple[pygame.Rect, tuple]:
+        return self.rect, (self.get_time_text(), self.bg_color, self.text_color)
 
     def draw(self, surface):
         pygame.draw.rect(surface, self.bg_color, self.rect)
 
-        minutes = int(self.remaining_time // 60)
-        seconds = int(self.remaining_time % 60)
-        time_str = f"{minutes:02}:{seconds:02}"
-        text_surface = self.font.render(time_str, True, self.text_color)
+        time_str = self.get_time_text()
+        text_surface = assets.render_text('arial', self.font_size, time_str, self.text_color)
         if text_surface.get_width() > self.width - 10:
             raise ValueError(f"Too long text ({text_surface.get_width()}) for clock width {self.width}.")
 
@@ -374,25 +488,23 @@ class Clock(object):
         surface.blit(text_surface, text_rect)  # Todo: változtatás
 
 
+def view_row_col(row: int, col: int) -> Tuple[int, int]:
+    """
+    Converts between the row and column of a piece (from white's side) and the row and column on the screen.
+    The conversion is its own inverse, so it is used both for drawing and for hit-testing the mouse.
+    """
+    if app.is_board_turned:
+        return 7 - row, 7 - col
+    return row, col
+
+
 def turn_board(button: Button):
     if button.is_visible:
         app.is_board_turned = not app.is_board_turned
 
-        for piece in pieces.pieces_list:
-            piece.row, piece.col = 7 - piece.row, 7 - piece.col
-            piece.update_rect()
-
-        if app.before_promotion_taken_piece is not None:
-            app.before_promotion_taken_piece.row = 7 - app.before_promotion_taken_piece.row
-            app.before_promotion_taken_piece.col = 7 - app.before_promotion_taken_piece.col
-            app.before_promotion_row = 7 - app.before_promotion_row
-            app.before_promotion_col = 7 - app.before_promotion_col
-
-        if app.last_move is not None:
-            app.last_move = ((7 - app.last_move[0][0], 7 - app.last_move[0][1]),
-                             (7 - app.last_move[1][0], 7 - app.last_move[1][1]))
-
-        app.board.legal_move_marks = None
+        promotion_tab = app.board.promotion_tab
+        if promotion_tab.is_visible:
+            promotion_tab.set_visible(promotion_tab.promotion_col)
 
 
 def menu_onclick(button: Button):
@@ -403,7 +515,7 @@ def menu_onclick(button: Button):
 class ScrollableText:
     def __init__(self, x, y, width, height, font_size=20, text_color=(255, 255, 255), bg_color=(0, 0, 0)):
         self.area = pygame.Rect(x, y, width, height)
-        self.font = pygame.font.Font(None, font_size)
+        self.font_size = font_size
         self.text_color = text_color
         self.bg_color = bg_color
         self.texts = []
@@ -415,7 +527,7 @@ class ScrollableText:
         if self.first_addition:
             app.game_texts.clear()  # Üríti a listát, ha ez az első hozzáadás
             self.first_addition = False  # Frissíti a flaget
-        text_surface = self.font.render(text, True, self.text_color)
+        text_surface = assets.render_text(None, self.font_size, text, self.text_color)
         self.texts.append((text, text_surface))
 
     def scroll(self, delta):
@@ -424,6 +536,9 @@ class ScrollableText:
         elif delta > 0 and self.texts and (self.offset < len(self.texts) * self.line_height - self.area.height):
             self.offset += delta
 
+    def get_region(self) -> Tuple[pygame.Rect, tuple]:
+        return self.area, (len(self.texts), self.offset)
+
     def draw(self, screen):
         screen.fill(self.bg_color, self.area)
         for i, (text, text_surf) in enumerate(self.texts):
@@ -464,6 +579,9 @@ class ToggleButton:
             self.is_playing = True
             print("Sound playing.")
 
+    def get_region(self) -> Tuple[pygame.Rect, tuple]:
+        return pygame.Rect(self.start_x, self.start_y, self.width, self.height), (self.is_visible, self.text.text)
+
     def set_text(self, new_text):
         """Set the text displayed on the button."""
         self.text.set_text(new_text)
@@ -484,9 +602,120 @@ def resign(button: Button):
     app.white_clock.stop()
     app.black_clock.stop()
 
+    # The game is saved by lose(), so the board is set up again only after it.
+    if not app.is_game_over:
+        app.lose(app.human_is_white if app.is_computer_opponent else app.is_white_on_turn)
+
     app.setup_pieces()
 
-    if app.is_white_on_turn:
-        app.lose()
-    else:
-        app.lose()
+
+class TextInput:
+    """Single line text field. Gets the typed (or pasted) text while it is focused by a click on it."""
+
+    def __init__(self, start_x, start_y, width, height, text_size, text_color, background_color, is_visible):
+        self.rect = pygame.Rect(start_x, start_y, width, height)
+        self.text_size = text_size
+        self.text_color = text_color
+        self.background_color = background_color
+        self.focused_border_color = pygame.Color(245, 215, 66)
+        self.is_visible = is_visible
+        self.is_focused = False
+        self.text = ""
+
+    def handle_event(self, event):
+        if not self.is_visible:
+            return
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == pygame.BUTTON_LEFT:
+            self.is_focused = self.rect.collidepoint(event.pos)
+        elif not self.is_focused:
+            return
+        elif event.type == pygame.TEXTINPUT:
+            self.text += event.text
+        elif event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_BACKSPACE:
+                self.text = self.text[:-1]
+            elif event.key == pygame.K_v and event.mod & pygame.KMOD_CTRL:
+                self.text += get_clipboard_text()
+
+    def get_region(self) -> Tuple[pygame.Rect, tuple]:
+        return self.rect, (self.is_visible, self.is_focused, self.text)
+
+    def draw(self, screen):
+        if not self.is_visible:
+            return
+        screen.fill(self.background_color, self.rect)
+        if self.is_focused:
+            pygame.draw.rect(screen, self.focused_border_color, self.rect, 3)
+
+        rendered_text = assets.render_text('arial', self.text_size, self.text, self.text_color)
+        # The end of a too long text is shown, where the typing happens.
+        inner_width = self.rect.width - 20
+        source = pygame.Rect(max(rendered_text.get_width() - inner_width, 0), 0, inner_width,
+                             rendered_text.get_height())
+        screen.blit(rendered_text, (self.rect.x + 10, self.rect.centery - rendered_text.get_height() // 2), source)
+
+
+def get_clipboard_text() -> str:
+    """
+    :return: The text on the clipboard, or empty string if it is not available.
+    """
+    try:
+        if not pygame.scrap.get_init():
+            pygame.scrap.init()
+        content = pygame.scrap.get(pygame.SCRAP_TEXT)
+    except pygame.error:
+        return ""
+    if not content:
+        return ""
+    return content.decode('utf-8', errors='ignore').strip('\x00').strip()
+
+
+class DirtyRegions:
+    """
+    Remembers what the regions of the screen showed in the last frame, so only the changed ones have to be redrawn
+    and passed to pygame.display.update().
+    """
+
+    def __init__(self):
+        self._regions: Dict[object, Tuple[pygame.Rect, object]] = {}
+        self._full_redraw = True
+
+    def invalidate(self) -> None:
+        """
+        The whole screen is redrawn in the next frame (e.g. after changing screens or when the window was exposed).
+        """
+        self._full_redraw = True
+
+    def collect(self, screen: pygame.Surface, regions: Dict[object, Tuple[pygame.Rect, object]]) -> List[pygame.Rect]:
+        """
+        :param regions: Key -> (area on the screen, state). The state must compare unequal when the area's picture
+            changes.
+        :return: The areas to redraw: the old and new area of every changed or disappeared region.
+        """
+        dirty = []
+        for key, (rect, state) in regions.items():
+            previous = self._regions.get(key)
+            if previous is None or previous[0] != rect or previous[1] != state:
+                dirty.append(pygame.Rect(rect))
+                if previous is not None and previous[0] != rect:
+                    dirty.append(previous[0])
+        for key in self._regions.keys() - regions.keys():
+            dirty.append(self._regions[key][0])
+        self._regions = {key: (pygame.Rect(rect), state) for key, (rect, state) in regions.items()}
+
+        if self._full_redraw:
+            self._full_redraw = False
+            return [screen.get_rect()]
+        return [rect for rect in dirty if rect.width > 0 and rect.height > 0]
+
+
+def draw_regions(screen: pygame.Surface, rects: List[pygame.Rect], background_color, draw) -> None:
+    """
+    Redraws only the given areas: the background is filled and draw(screen) is called with the area as clip, so
+    every blit outside of it is skipped.
+    """
+    for rect in rects:
+        screen.set_clip(rect)
+        screen.fill(background_color)
+        draw(screen)
+    screen.set_clip(None)
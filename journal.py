@@ -0,0 +1,371 @@
+import errno
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from typing import BinaryIO, Callable, Iterator, List, NamedTuple, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+"""
+Contains the game journal: one append-only file holding every saved game, finished or in progress, as a sequence of
+length-prefixed records. Nothing is ever overwritten, a game saved again (e.g. after every move) gets a new record.
+
+Record: header (text length, CRC32 of the rest, game id, is finished flag), then the game as UTF-8 text (PGN).
+A sidecar index file (journal path + INDEX_SUFFIX) holds the offset of every record, so any record can be read
+without scanning the journal. fsync is batched: it is called after every SYNC_EVERY records or SYNC_INTERVAL seconds,
+and on sync() / close(). A record torn by a crash (half written or corrupt) is cut off when the journal is opened.
+Only one process can have a journal open at a time, it is locked by a lock file (journal path + LOCK_SUFFIX).
+"""
+
+RECORD_HEADER = struct.Struct('<IIIB')  # Text length, CRC32 of the game id, the flag and the text, game id, finished.
+RECORD_KEY = struct.Struct('<IB')  # Game id and is finished flag, the part of the header covered by the CRC.
+OFFSET = struct.Struct('<Q')  # An entry of the index.
+INDEX_SUFFIX = '.idx'
+LOCK_SUFFIX = '.lock'
+MAX_RECORD_SIZE = 16 * 1024 * 1024  # Bigger lengths can only come from a corrupt header.
+MAX_JOURNALS = 16  # Tried by open_journal(), the journal and the numbered ones.
+LOCKED_ERRNOS = (errno.EWOULDBLOCK, errno.EAGAIN, errno.EACCES)  # The lock is held by another process.
+
+SYNC_EVERY = 16  # Records
+SYNC_INTERVAL = 1.0  # Seconds
+WRITE_QUEUE_SIZE = 64  # Records waiting for the writer thread.
+WRITER_POLL_INTERVAL = 0.1  # Seconds between checks whether the writer thread is still alive, while waiting for it.
+
+
+class Record(NamedTuple):
+    game_id: int
+    is_finished: bool
+    text: str
+
+
+class JournalLockedError(OSError):
+    """Raised when the journal is already open in another process."""
+
+
+class Journal:
+    def __init__(self, path: str, sync_every: int = SYNC_EVERY, sync_interval: float = SYNC_INTERVAL):
+        """
+        Opens the journal, creates it if it does not exist yet, and recovers it after a crash: a torn last record
+        is cut off, and the index is repaired to match the journal.
+        :param path: Path of the journal file. The index is stored next to it.
+        :param sync_every: fsync after this many appended records at the latest.
+        :param sync_interval: fsync when an append comes at least this many seconds after the last fsync.
+        :raises JournalLockedError: If another process has the journal open.
+        """
+        if sync_every < 1:
+            raise ValueError(f"Sync batch must be at least 1 record, got {sync_every}.")
+
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        # Each process keeps its own end offset and game ids, so two writers would corrupt the index.
+        self._lock: BinaryIO = open(path + LOCK_SUFFIX, 'a+b')
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                self._lock.seek(0)
+                msvcrt.locking(self._lock.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError as error:
+            self._lock.close()
+            if error.errno not in LOCKED_ERRNOS:
+                raise  # E.g. the file system does not support locks, another journal would not help.
+            raise JournalLockedError(f"The journal {path} is already open in another process.") from error
+        self._file: BinaryIO = open(path, 'a+b')
+        self._index: BinaryIO = open(path + INDEX_SUFFIX, 'a+b')
+        self._count = 0
+        self._size = 0  # Of the journal, the end of the last valid record.
+        self._last_game_id = -1
+        self._unsynced = 0
+        self._last_sync = time.perf_counter()
+        self._recover()
+
+    def _recover(self) -> None:
+        journal_size = os.fstat(self._file.fileno()).st_size
+        count = os.fstat(self._index.fileno()).st_size // OFFSET.size
+
+        # The index is written after the journal, so its last entries may point to records lost in a crash.
+        end = 0
+        while count:
+            offset = self._read_offset(count - 1)
+            record_end = self._check_record(offset, journal_size)
+            if record_end is not None:
+                end = record_end
+                break
+            count -= 1
+
+        # Records after the last indexed one, whose index entries were lost.
+        missing_offsets = []
+        while True:
+            record_end = self._check_record(end, journal_size)
+            if record_end is None:
+                break
+            missing_offsets.append(end)
+            end = record_end
+
+        if end < journal_size:
+            self._file.truncate(end)
+        self._index.truncate(count * OFFSET.size)
+        for offset in missing_offsets:
+            self._index.write(OFFSET.pack(offset))
+        self._count = count + len(missing_offsets)
+        self._size = end
+        if self._count:
+            self._last_game_id = self.read(self._count - 1).game_id
+        self.sync()
+
+    def _check_record(self, offset: int, journal_size: int) -> Optional[int]:
+        """
+        :return: The end offset of the record at the given offset, or None if it is torn or corrupt.
+        """
+        if offset + RECORD_HEADER.size > journal_size:
+            return None
+        self._file.seek(offset)
+        length, crc, game_id, is_finished = RECORD_HEADER.unpack(self._file.read(RECORD_HEADER.size))
+        end = offset + RECORD_HEADER.size + length
+        if length > MAX_RECORD_SIZE or end > journal_size:
+            return None
+        if zlib.crc32(RECORD_KEY.pack(game_id, is_finished) + self._file.read(length)) != crc:
+            return None
+        return end
+
+    def _read_offset(self, number: int) -> int:
+        self._index.seek(number * OFFSET.size)
+        return OFFSET.unpack(self._index.read(OFFSET.size))[0]
+
+    @property
+    def next_game_id(self) -> int:
+        """
+        The id of a new game: one more than the id of the last record, as games are saved in the order they start.
+        """
+        return self._last_game_id + 1
+
+    def append(self, game_id: int, is_finished: bool, text: str) -> int:
+        """
+        Appends a record of a game. It is durable after the next fsync, see sync().
+        :param game_id: Records of the same game share the id, the last one is its latest state.
+        :param is_finished: False for an in-progress save of a game.
+        :param text: The game, e.g. in PGN.
+        :return: The number of the new record.
+        """
+        data = text.encode('utf-8')
+        if len(data) > MAX_RECORD_SIZE:
+            raise ValueError(f"Record is too big: {len(data)} bytes.")
+        key = RECORD_KEY.pack(game_id, is_finished)
+        self._file.write(RECORD_HEADER.pack(len(data), zlib.crc32(key + data), game_id, is_finished) + data)
+        self._index.write(OFFSET.pack(self._size))
+        self._size += RECORD_HEADER.size + len(data)
+        self._count += 1
+        self._last_game_id = game_id
+
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every or time.perf_counter() - self._last_sync >= self.sync_interval:
+            self.sync()
+        return self._count - 1
+
+    @property
+    def unsynced(self) -> int:
+        """
+        Number of records appended since the last fsync.
+        """
+        return self._unsynced
+
+    def sync(self) -> None:
+        """
+        Writes the appended records to the disk. The journal first, so the index never points past its end.
+        """
+        for file in (self._file, self._index):
+            file.flush()
+            os.fsync(file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.perf_counter()
+
+    def read(self, number: int) -> Record:
+        """
+        :param number: Number of the record, in the order of appending. Negative numbers count from the end.
+        """
+        if number < 0:
+            number += self._count
+        if not 0 <= number < self._count:
+            raise IndexError(f"There is no record {number}, the journal has {self._count}.")
+        self._file.flush()
+        self._index.flush()
+        self._file.seek(self._read_offset(number))
+        length, _, game_id, is_finished = RECORD_HEADER.unpack(self._file.read(RECORD_HEADER.size))
+        return Record(game_id, bool(is_finished), self._file.read(length).decode('utf-8'))
+
+    def records(self) -> Iterator[Record]:
+        """
+        Reads the records one by one, in the order of appending.
+        """
+        for number in range(self._count):
+            yield self.read(number)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        self.sync()
+        self._file.close()
+        self._index.close()
+        self._lock.close()  # Releases the lock.
+
+
+def open_journal(path: str) -> Journal:
+    """
+    Opens the journal, or if another process has it open, the first free one of the numbered journals next to it
+    (e.g. games.1.journal for games.journal). So several instances can run on the same machine.
+    :raises JournalLockedError: If all of the MAX_JOURNALS journals are open in other processes.
+    """
+    root, extension = os.path.splitext(path)
+    for number in range(MAX_JOURNALS):
+        try:
+            return Journal(path if number == 0 else f"{root}.{number}{extension}")
+        except JournalLockedError:
+            pass
+    raise JournalLockedError(f"All of the {MAX_JOURNALS} journals of {path} are open in other processes.")
+
+
+class JournalWriter:
+    """
+    Appends records to a journal in a background thread, so the caller (the render loop) never waits for the disk.
+    Records are passed through a bounded queue. Errors of the writes are passed back through another queue, which is
+    polled without waiting. The journal must not be used directly until the writer is closed.
+    """
+
+    def __init__(self, journal: Journal, queue_size: int = WRITE_QUEUE_SIZE,
+                 on_error: Optional[Callable[[], None]] = None):
+        """
+        :param queue_size: The most records waiting to be written.
+        :param on_error: Called from the writer thread when an error is ready to poll, e.g. to wake up the caller.
+        """
+        self.journal = journal
+        self.on_error = on_error
+        self._records: queue.Queue = queue.Queue(queue_size)
+        self._errors: queue.Queue = queue.Queue()
+        self._next_game_id = journal.next_game_id
+        self._thread: Optional[threading.Thread] = threading.Thread(target=self._run, name="journal-writer",
+                                                                    daemon=True)
+        self._thread.start()
+
+    @property
+    def next_game_id(self) -> int:
+        """
+        Like Journal.next_game_id, but counts the queued records too.
+        """
+        return self._next_game_id
+
+    def append(self, game_id: int, is_finished: bool, text: str) -> bool:
+        """
+        Queues a record to append, see Journal.append(). A finished game waits for a free place in a full queue.
+        An in-progress save is dropped instead, the next save of the game contains everything it did.
+        :return: True if the record was queued. False if it was dropped, or the writer thread has stopped (this is
+        also reported as an error).
+        """
+        if self._thread is None:
+            raise ValueError("The journal writer is closed.")
+        self._next_game_id = max(self._next_game_id, game_id + 1)
+        record = Record(game_id, is_finished, text)
+        if not is_finished:
+            try:
+                self._records.put_nowait(record)
+            except queue.Full:
+                return False
+            return True
+        if not self._put(record):
+            self._report(RuntimeError(f"The journal writer has stopped, game {game_id} was not saved."))
+            return False
+        return True
+
+    def _put(self, item: Optional[Record]) -> bool:
+        """
+        Waits for a free place in the queue, but only while the writer thread is alive to make one.
+        :return: False if the thread has stopped.
+        """
+        while self._thread.is_alive():
+            try:
+                self._records.put(item, timeout=WRITER_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _run(self) -> None:
+        try:
+            self._write_records()
+        except Exception as error:
+            self._report(RuntimeError(f"The journal writer has stopped: {error!r}"))
+
+    def _write_records(self) -> None:
+        while True:
+            try:
+                record = self._records.get(timeout=self.journal.sync_interval)
+            except queue.Empty:
+                # Idle: the batched records need not wait for the next append to become durable.
+                if self.journal.unsynced:
+                    self._write(self.journal.sync)
+                continue
+
+            try:
+                if record is None:
+                    self._write(self.journal.close)
+                    return
+                self._write(lambda: self.journal.append(*record))
+            finally:
+                self._records.task_done()
+
+    def _write(self, write: Callable[[], object]) -> None:
+        try:
+            write()
+        except Exception as error:  # Any error must reach the caller, the thread has to keep running.
+            self._report(error)
+
+    def _report(self, error: Exception) -> None:
+        self._errors.put(error)
+        if self.on_error is not None:
+            try:
+                self.on_error()
+            except Exception:
+                pass  # The error is still polled by poll_errors().
+
+    def poll_errors(self) -> List[Exception]:
+        """
+        :return: The errors of the writes since the last call, empty if there were none. Never blocks.
+        """
+        errors = []
+        while True:
+            try:
+                errors.append(self._errors.get_nowait())
+            except queue.Empty:
+                return errors
+
+    def flush(self) -> None:
+        """
+        Waits until every queued record is written. (They are durable after the next sync of the journal.)
+        Returns early if the writer thread has stopped.
+        """
+        done = self._records.all_tasks_done
+        with done:
+            while self._records.unfinished_tasks and self._thread is not None and self._thread.is_alive():
+                done.wait(WRITER_POLL_INTERVAL)
+
+    def close(self) -> None:
+        """
+        Writes the queued records, then syncs and closes the journal. Waits for the thread, if it is still running.
+        """
+        if self._thread is None:
+            return
+        if self._put(None):
+            self._thread.join()
+        else:
+            self._write(self.journal.close)
+        self._thread = None
@@ -0,0 +1,154 @@
+import re
+from typing import List
+
+import rules
+
+"""
+Contains the text forms of the moves: Standard Algebraic Notation (SAN), used by the move list and PGN, and UCI (from
+and to squares, e.g. e7e8q).
+Both directions need the legal moves only of the pieces that can reach the target square, see
+rules.Position.legal_moves_of().
+"""
+
+FILES = 'abcdefgh'  # By column.
+RANKS = '87654321'  # By row.
+FILE_MASKS = [sum(1 << rules.square(row, col) for row in range(8)) for col in range(8)]
+RANK_MASKS = [sum(1 << rules.square(row, col) for col in range(8)) for row in range(8)]
+
+# Piece letter, from file, from rank, capture, target square, promotion.
+SAN_PATTERN = re.compile(r'^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$')
+
+
+def move_to_san(position: rules.Position, move: rules.Move) -> str:
+    """
+    :param position: The position before the move. It is the same again when the function returns.
+    :param move: A legal move of the side to move.
+    :return: The move in SAN, e.g. Nbd7, exd6, e8=Q+, O-O#
+    """
+    san = _san_without_suffix(position, move)
+    position.make_move(move)
+    san += _check_suffix(position)
+    position.unmake_move()
+    return san
+
+
+def moves_to_san(position: rules.Position, moves: List[rules.Move]) -> List[str]:
+    """
+    Converts the moves of a game. Faster than move_to_san() move by move, because every move is made only once.
+    :param position: The position before the first move. The moves are made on it, so when the function returns, it
+    is the position after the last move.
+    :return: The moves in SAN.
+    """
+    sans = []
+    for move in moves:
+        san = _san_without_suffix(position, move)
+        position.make_move(move)
+        sans.append(san + _check_suffix(position))
+    return sans
+
+
+def _san_without_suffix(position: rules.Position, move: rules.Move) -> str:
+    from_square, to_square, promotion = rules.decode_move(move)
+    flags = rules.move_flags(move)
+    if flags == rules.MOVE_CASTLING:
+        return 'O-O' if rules.square_col(to_square) == 6 else 'O-O-O'
+
+    piece = position.board[from_square]
+    kind = piece.upper()
+    capture = 'x' if flags & rules.MOVE_CAPTURE else ''
+    if kind == 'P':
+        san = (FILES[rules.square_col(from_square)] + capture if capture else '') + rules.square_name(to_square)
+        return san + '=' + promotion if promotion is not None else san
+
+    return kind + _disambiguation(position, piece, from_square, to_square) + capture + rules.square_name(to_square)
+
+
+def _check_suffix(position: rules.Position) -> str:
+    """
+    :param position: The position after the move.
+    """
+    if not position.is_in_check():
+        return ''
+    return '+' if position.has_legal_move() else '#'
+
+
+def _disambiguation(position: rules.Position, piece: str, from_square: int, to_square: int) -> str:
+    """
+    :return: The file, the rank or both of the from square, if another piece of the same kind can also move to the
+    target square. Otherwise an empty string.
+    """
+    # The pieces attacking the target square are the only candidates, only these need their legal moves.
+    rivals = position.attackers(to_square, piece) & ~(1 << from_square)
+    if not rivals or piece in 'Kk':
+        return ''
+    others = {move & 63 for move in position.legal_moves_of(rivals) if move >> 6 & 63 == to_square}
+    if not others:
+        return ''
+
+    col, row = rules.square_col(from_square), rules.square_row(from_square)
+    if all(rules.square_col(other) != col for other in others):
+        return FILES[col]
+    if all(rules.square_row(other) != row for other in others):
+        return RANKS[row]
+    return rules.square_name(from_square)
+
+
+def san_to_move(position: rules.Position, san: str) -> rules.Move:
+    """
+    Finds the legal move of the side to move that the SAN text describes. Check and annotation marks are ignored,
+    so are a missing capture mark or a missing '=' of a promotion.
+    :param san: A move in SAN, e.g. Nbd7, exd6, e8=Q+, O-O
+    :return: The legal move.
+    :raises ValueError: If the text is not a move, or there is no such legal move, or it is ambiguous.
+    """
+    text = san.strip().rstrip('+#!?')
+
+    if text in ('O-O', '0-0', 'O-O-O', '0-0-0'):
+        king_square = position.king_square(position.white_to_move)
+        target_col = 6 if len(text) == 3 else 2
+        for move in position.legal_moves_of(1 << king_square):
+            if rules.move_flags(move) == rules.MOVE_CASTLING and rules.square_col(move >> 6 & 63) == target_col:
+                return move
+        raise ValueError(f"Illegal move in position {position.to_fen()}: {san}")
+
+    match = SAN_PATTERN.match(text)
+    if match is None:
+        raise ValueError(f"Invalid SAN move: {san}")
+    kind, from_file, from_rank, to_name, promotion = match.groups()
+
+    kind = kind or 'P'
+    piece = kind if position.white_to_move else kind.lower()
+    to_square = rules.parse_square(to_name)
+    if kind == 'P':
+        # The pawn comes from its own file, or from the given one when it captures.
+        candidates = position.bitboards[piece] & FILE_MASKS[FILES.index(from_file or to_name[0])]
+    else:
+        candidates = position.attackers(to_square, piece)
+    if from_file is not None:
+        candidates &= FILE_MASKS[FILES.index(from_file)]
+    if from_rank is not None:
+        candidates &= RANK_MASKS[RANKS.index(from_rank)]
+
+    found = [move for move in position.legal_moves_of(candidates)
+             if move >> 6 & 63 == to_square and rules.move_promotion(move) == promotion]
+    if not found:
+        raise ValueError(f"Illegal move in position {position.to_fen()}: {san}")
+    if len(found) > 1:
+        raise ValueError(f"Ambiguous move in position {position.to_fen()}: {san}")
+    return found[0]
+
+
+def uci_to_move(position: rules.Position, text: str) -> rules.Move:
+    """
+    :param text: A move in UCI form, e.g. e2e4 or e7e8q.
+    :return: The legal move of the side to move.
+    :raises ValueError: If the text is not a legal move of the position.
+    """
+    text = text.strip()
+    if len(text) not in (4, 5):
+        raise ValueError(f"Invalid UCI move: {text}")
+    promotion = text[4].upper() if len(text) == 5 else None
+    move = position.find_move(rules.parse_square(text[:2]), rules.parse_square(text[2:4]), promotion)
+    if move is None:
+        raise ValueError(f"Illegal move in position {position.to_fen()}: {text}")
+    return move
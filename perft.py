@@ -0,0 +1,128 @@
+import argparse
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import rules
+
+"""
+Perft: counts the leaf nodes of the legal move tree. (Speed and correctness check of the move generator.)
+
+Usage:
+    python perft.py 4                          # starting position, depth 4
+    python perft.py 3 --position kiwipete --divide
+    python perft.py 3 --position all --check   # exits with 1 if any count differs from the reference
+    python perft.py 2 --fen "8/8/8/8/8/8/8/K6k w - - 0 1"
+"""
+
+# name: (FEN, reference node counts from depth 1)
+TEST_POSITIONS: Dict[str, Tuple[str, List[int]]] = {
+    'start': ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+              [20, 400, 8902, 197281, 4865609, 119060324]),
+    'kiwipete': ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+                 [48, 2039, 97862, 4085603, 193690690]),
+    'position3': ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+                  [14, 191, 2812, 43238, 674624, 11030083]),
+    'position4': ("r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+                  [6, 264, 9467, 422333, 15833292]),
+    'position5': ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+                  [44, 1486, 62379, 2103487, 89941194]),
+    'position6': ("r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+                  [46, 2079, 89890, 3894594, 164075551]),
+}
+
+
+def perft(position: rules.Position, depth: int) -> int:
+    """
+    :param position: The examined position. It is the same after the call (moves are made and unmade).
+    :param depth: Number of plies to search.
+    :return: Number of leaf nodes at the given depth.
+    """
+    if depth == 0:
+        return 1
+
+    moves = position.legal_moves()
+    if depth == 1:
+        return len(moves)
+
+    nodes = 0
+    for move in moves:
+        position.make_move(move)
+        nodes += perft(position, depth - 1)
+        position.unmake_move()
+    return nodes
+
+
+def divide(position: rules.Position, depth: int) -> Dict[str, int]:
+    """
+    :return: Dictionary move (coordinate notation) -> leaf nodes after the move, for every legal root move.
+    """
+    if depth < 1:
+        raise ValueError(f"Divide needs at least depth 1, got {depth}.")
+
+    result = {}
+    for move in position.legal_moves():
+        position.make_move(move)
+        result[rules.move_to_uci(move)] = perft(position, depth - 1)
+        position.unmake_move()
+    return result
+
+
+def run(name: str, position: rules.Position, depth: int, show_divide: bool, reference: Optional[List[int]]) -> bool:
+    """
+    Runs and reports perft of one position.
+    :return: False if the node count differs from the reference, True otherwise (also if there is no reference).
+    """
+    start = time.perf_counter()
+    if show_divide:
+        counts = divide(position, depth)
+        for move, nodes in sorted(counts.items()):
+            print(f"  {move}: {nodes}")
+        nodes = sum(counts.values())
+    else:
+        nodes = perft(position, depth)
+    elapsed = time.perf_counter() - start
+
+    nodes_per_second = nodes / elapsed if elapsed > 0 else float('inf')
+    line = f"{name}: depth {depth}, nodes {nodes}, {elapsed:.3f} s, {nodes_per_second:,.0f} nodes/s"
+
+    if reference is None:
+        print(line)
+        return True
+    if depth > len(reference):
+        print(f"{line} (no reference for this depth)")
+        return True
+    expected = reference[depth - 1]
+    print(f"{line} {'OK' if nodes == expected else f'MISMATCH, expected {expected}'}")
+    return nodes == expected
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Perft of the rules core move generator.")
+    parser.add_argument('depth', type=int, help="Number of plies.")
+    parser.add_argument('--position', default='start', choices=list(TEST_POSITIONS) + ['all'],
+                        help="Test position to run (default: the starting position).")
+    parser.add_argument('--fen', help="Run from this FEN instead of a test position.")
+    parser.add_argument('--divide', action='store_true', help="Print the node count of every root move.")
+    parser.add_argument('--check', action='store_true', help="Compare to the reference counts, exit 1 on mismatch.")
+    args = parser.parse_args(argv)
+
+    if args.depth < 1:
+        parser.error(f"Depth must be at least 1, got {args.depth}.")
+
+    if args.fen is not None:
+        return 0 if run('fen', rules.Position.from_fen(args.fen), args.depth, args.divide, None) else 1
+
+    names = list(TEST_POSITIONS) if args.position == 'all' else [args.position]
+    all_passed = True
+    for name in names:
+        fen, reference = TEST_POSITIONS[name]
+        # The starting position is built exactly like the game builds it (application.setup_pieces).
+        position = rules.Position.initial() if name == 'start' else rules.Position.from_fen(fen)
+        if not run(name, position, args.depth, args.divide, reference if args.check else None):
+            all_passed = False
+    return 0 if all_passed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
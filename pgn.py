@@ -0,0 +1,149 @@
+import re
+from datetime import date
+from typing import Dict, IO, Iterator, List, NamedTuple, Optional
+
+import notation
+import rules
+
+"""
+Contains the Portable Game Notation (PGN): export of a game, and a reader that streams the games of a PGN file one by
+one, replaying their moves through the rules core. Only one game is held in memory at a time, so the size of the
+file does not matter.
+"""
+
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+SEVEN_TAG_ROSTER = ('Event', 'Site', 'Date', 'Round', 'White', 'Black', 'Result')
+LINE_LENGTH = 79  # The longest movetext line, as the PGN standard recommends.
+
+HEADER_PATTERN = re.compile(r'^\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*]\s*$')
+# Comments, NAGs, variation parentheses, move numbers and everything else (moves and results), in this order.
+MOVETEXT_TOKEN = re.compile(r'\{[^}]*}|;[^\n]*|\$\d+|[()]|\d+\.+|[^\s{}();$.]+')
+
+
+class Game(NamedTuple):
+    headers: Dict[str, str]
+    moves: List[rules.Move]
+    position: rules.Position  # After the last move.
+    result: str  # One of RESULTS.
+
+
+def format_date(day: date) -> str:
+    """
+    :return: The date in the PGN form, e.g. 2024.03.01
+    """
+    return day.strftime('%Y.%m.%d')
+
+
+def write_game(file: IO[str], moves: List[rules.Move], result: str = '*', start_fen: Optional[str] = None,
+               headers: Optional[Dict[str, str]] = None) -> None:
+    """
+    Writes a game in PGN, followed by an empty line.
+    :param moves: The moves of the game, from the starting position.
+    :param result: One of RESULTS.
+    :param start_fen: The starting position. Optional: If not given, then the standard one.
+    :param headers: Tag name -> value. The missing tags of the seven tag roster are written as unknown ('?').
+    """
+    if result not in RESULTS:
+        raise ValueError(f"Result must be one of {RESULTS}, got {result}.")
+
+    initial_fen = rules.Position.initial().to_fen()
+    position = rules.Position.from_fen(start_fen) if start_fen else rules.Position.initial()
+    tags = {tag: '?' for tag in SEVEN_TAG_ROSTER}
+    tags.update(headers or {})
+    tags['Result'] = result
+    if start_fen and position.to_fen() != initial_fen:
+        tags['SetUp'], tags['FEN'] = '1', position.to_fen()
+
+    for tag, value in tags.items():
+        value = value.replace('\\', '\\\\').replace('"', '\\"')
+        file.write(f'[{tag} "{value}"]\n')
+    file.write('\n')
+
+    move_number, white_to_move = position.fullmove_number, position.white_to_move
+    tokens = []
+    for i, san in enumerate(notation.moves_to_san(position, moves)):
+        if white_to_move:
+            tokens.append(f"{move_number}.")
+        elif i == 0:
+            tokens.append(f"{move_number}...")
+        tokens.append(san)
+        if not white_to_move:
+            move_number += 1
+        white_to_move = not white_to_move
+    tokens.append(result)
+
+    line = ''
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > LINE_LENGTH:
+            file.write(line + '\n')
+            line = token
+        else:
+            line = f"{line} {token}" if line else token
+    file.write(line + '\n\n')
+
+
+def read_games(file: IO[str], skip_invalid: bool = False) -> Iterator[Game]:
+    """
+    Reads the games of a PGN file one after the other, lazily. Comments, variations and NAGs are skipped.
+    :param file: Text file opened for reading. It is read line by line, never as a whole.
+    :param skip_invalid: If True, games with an illegal or unreadable move are left out, otherwise they raise.
+    :raises ValueError: If a game is invalid and skip_invalid is False.
+    """
+    headers: Dict[str, str] = {}
+    movetext: List[str] = []
+    comment_depth = 0  # Open braces, a '[' at the start of a line inside a comment is not a header.
+
+    for line in file:
+        stripped = line.strip()
+        if stripped.startswith('%'):
+            continue  # Escape mechanism of the standard, the line is ignored.
+        if comment_depth == 0 and stripped.startswith('['):
+            if movetext:
+                game = _replay(headers, movetext, skip_invalid)
+                if game is not None:
+                    yield game
+                headers, movetext = {}, []
+            match = HEADER_PATTERN.match(stripped)
+            if match is not None:
+                headers[match.group(1)] = re.sub(r'\\(.)', r'\1', match.group(2))
+            continue
+        if stripped:
+            movetext.append(stripped)
+            comment_depth = max(comment_depth + stripped.count('{') - stripped.count('}'), 0)
+
+    if headers or movetext:
+        game = _replay(headers, movetext, skip_invalid)
+        if game is not None:
+            yield game
+
+
+def _replay(headers: Dict[str, str], movetext: List[str], skip_invalid: bool) -> Optional[Game]:
+    """
+    Plays the moves of a game on its starting position.
+    :return: The game, or None if it is invalid and skip_invalid is True.
+    """
+    try:
+        fen = headers.get('FEN')
+        position = rules.Position.from_fen(fen) if fen else rules.Position.initial()
+        moves = []
+        result = headers.get('Result', '*')
+        variation_depth = 0
+        for token in MOVETEXT_TOKEN.findall('\n'.join(movetext)):
+            if token == '(':
+                variation_depth += 1
+            elif token == ')':
+                variation_depth = max(variation_depth - 1, 0)
+            elif variation_depth or token[0] in '{;$' or token[0].isdigit() and token.endswith('.'):
+                continue
+            elif token in RESULTS:
+                result = token
+            else:
+                move = notation.san_to_move(position, token)
+                position.make_move(move)
+                moves.append(move)
+    except ValueError as error:
+        if skip_invalid:
+            return None
+        raise ValueError(f"Invalid game {headers.get('White', '?')} - {headers.get('Black', '?')} "
+                         f"({headers.get('Date', '?')}): {error}") from error
+    return Game(headers, moves, position, result)
@@ -1,29 +1,57 @@
 import pygame
 import application as app
+import assets
 import graphics
+import rules
 from abc import ABC, abstractmethod
 from typing import List
 from typing import Tuple
 from typing import Optional
 
 """
-Contains Piece related elements. (Piece mechanics.)
+Contains Piece related elements. (Piece sprites, the rules are in the rules module.)
 """
 
 pieces_list: List['Piece'] = []
+square_index: List[Optional['Piece']] = [None] * 64  # Pieces of pieces_list by row * 8 + col.
 white_king: 'King'
 black_king: 'King'
-en_passant_candidate: Optional['Pawn'] = None
 promotion_piece: Optional[str] = None
+position: rules.Position = rules.Position.initial()
+sprites_position: Optional[rules.Position] = None  # The position the sprites were created for, see ensure_sprites().
 
-piece_values = {
-    'Pawn': 1,
-    'Rook': 5,
-    'Knight': 3,
-    'Bishop': 3,
-    'Queen': 9,
-    'King': 1
-}
+piece_values = rules.piece_values
+
+
+def to_square(row: int, col: int) -> int:
+    """
+    Converts a row and column of a piece to a square of the rules core.
+    Pieces are stored from white's side (row 0 is the 8th rank), the turned board is only a view, see
+    graphics.view_row_col().
+    :return: The square index of the rules.Position.
+    """
+    return rules.square(row, col)
+
+
+def to_row_col(square: int) -> Tuple[int, int]:
+    """
+    Converts a square of the rules core to the row and column of a piece.
+    :param square: The square index of the rules.Position.
+    :return: (row, col) from white's side.
+    """
+    return rules.square_row(square), rules.square_col(square)
+
+
+def create_piece(letter: str, row: int, col: int) -> 'Piece':
+    """
+    Creates the sprite of a rules core piece.
+    :param letter: Piece letter of the rules core. (Uppercase for white, lowercase for black.)
+    :param row: Row of the piece from white's side.
+    :param col: Column of the piece from white's side.
+    :return: The new Piece.
+    """
+    piece_class = {'P': Pawn, 'N': Knight, 'B': Bishop, 'R': Rook, 'Q': Queen, 'K': King}[letter.upper()]
+    return piece_class(row, col, rules.is_white_piece(letter))
 
 
 def find_piece(row: int, col: int, pieces: List['Piece'] = None) -> Optional['Piece']:
@@ -37,8 +65,11 @@ def find_piece(row: int, col: int, pieces: List['Piece'] = None) -> Optional['Pi
     if not isinstance(row, int) or not isinstance(col, int):
         raise TypeError(f"Parameter row and col must be integers.")
 
-    if pieces is None:
-        pieces = pieces_list
+    if pieces is None or pieces is pieces_list:
+        ensure_sprites()
+        if 0 <= row <= 7 and 0 <= col <= 7:
+            return square_index[row * 8 + col]
+        return None
 
     for piece in pieces:
         if piece.row == row and piece.col == col:
@@ -46,11 +77,50 @@ def find_piece(row: int, col: int, pieces: List['Piece'] = None) -> Optional['Pi
     return None
 
 
-def is_square_under_attack(row, col):
+def ensure_sprites() -> None:
+    """
+    Creates the sprites of the position's pieces, unless they were already created since the position was set up.
+    (Setting up a position only builds the rules core board, the sprites are made when they are first needed.)
+    """
+    global pieces_list, sprites_position, white_king, black_king
+
+    if sprites_position is position:
+        return
+    sprites_position = position
+
+    pieces_list = []
+    rebuild_square_index()
+    app.pieces_group.empty()
+    for square, letter in enumerate(position.board):
+        if letter is not None:
+            piece = create_piece(letter, *to_row_col(square))
+            piece.add_to_list()
+            if letter == 'K':
+                white_king = piece
+            elif letter == 'k':
+                black_king = piece
+
+
+def rebuild_square_index() -> None:
+    """
+    Refills the square index from pieces_list. Must be called after pieces' row or col were set directly.
+    """
+    global square_index
+    square_index = [None] * 64
     for piece in pieces_list:
-        if piece.is_enemy(find_piece(row, col)) and piece.is_legal_move(row, col, handle_check=False):
-            return True
-    return False
+        square_index[piece.row * 8 + piece.col] = piece
+
+
+def is_square_under_attack(row: int, col: int, by_white: Optional[bool] = None) -> bool:
+    """
+    :param row: Row of the square from white's side.
+    :param col: Column of the square from white's side.
+    :param by_white: Color of the attacking side. Optional: If not given, then the opponent of the side to move.
+    :return: True if the square is attacked.
+    """
+    if by_white is None:
+        by_white = not position.white_to_move
+    return position.is_square_attacked(to_square(row, col), by_white)
 
 
 def get_all_legal_moves(piece: 'Piece') -> List[Optional[Tuple[int, int]]]:
@@ -61,8 +131,7 @@ def calculate_piece_start_on_screen(piece: 'Piece', x=0, y=0) -> Tuple[int, int]
     if not isinstance(piece, Piece):
         raise ValueError(f"Piece type required for piece, got {type(piece)}")
 
-    piece_col = piece.col
-    piece_row = piece.row
+    piece_row, piece_col = graphics.view_row_col(piece.row, piece.col)
 
     start_x = x + piece_col * graphics.SQUARE_SIZE
     start_y = y + piece_row * graphics.SQUARE_SIZE
@@ -92,20 +161,7 @@ def mating_force() -> bool:
     Determines whether is there enough force to mate the opponents king.
     :return: True value, if there is enough force, False if the game cannot be decided in any way.
     """
-    first_bishop = pieces_list[0]  # what?
-    if len(pieces_list) > 3:
-        if same_squared_pieces(first_bishop, pieces_list):
-            return False
-        return True
-    if len(pieces_list) == 3:
-        for piece in pieces_list:
-            if isinstance(piece, (Bishop, Knight)):
-                return False
-        return True
-    return False
-
-
-# nincs még sehol se meghívva.
+    return position.has_mating_material()
 
 
 class Piece(ABC, pygame.sprite.Sprite):
@@ -115,8 +171,7 @@ class Piece(ABC, pygame.sprite.Sprite):
         self.col = col
         self._is_white = None
         self.is_white = is_white
-        self.image = pygame.image.load(f"images/{'white' if self.is_white else 'black'}/{self}.png")
-        self.image = pygame.transform.scale(self.image, (graphics.SQUARE_SIZE, graphics.SQUARE_SIZE))
+        self.image = assets.get_piece_image(self.is_white, f"{self}", graphics.SQUARE_SIZE)
         start_on_screen = calculate_piece_start_on_screen(self)
         self.rect = self.image.get_rect(left=start_on_screen[0], top=start_on_screen[1])
         self.is_dragged = False
@@ -128,7 +183,7 @@ class Piece(ABC, pygame.sprite.Sprite):
                 where_row (int): The row of the specified position. Expected values from 0 to 7.
                 where_col (int): The column of the specified position. Expected values from 0 to 7.
                 handle_check (bool): Take care with check or ignore?
-                pieces (list): All pieces of a position. Optional: If not given, then the current position will be used.
+                pieces (list): Not used anymore, the rules core position is always used. Kept for old callers.
             Return:
                 bool: Is the specified place a legal move?
         """
@@ -137,34 +192,29 @@ class Piece(ABC, pygame.sprite.Sprite):
         if not isinstance(handle_check, bool):
             raise TypeError(f"Parameter handle_check ({handle_check}) must be bool.")
 
-        if handle_check:
-            if pieces is None:
-                pieces = pieces_list
-
-            piece_copy: Piece = self.__class__(where_row, where_col, self.is_white)
-            simulated_pieces: List[Piece] = []
-            simulated_own_king: Optional[King] = None
-
-            for piece in pieces:
-                simulated_piece_copy = piece.__copy__()
-                if not piece.is_equal(self) and not piece.is_equal(piece_copy):
-                    simulated_pieces.append(simulated_piece_copy)
-                    if isinstance(simulated_piece_copy, King) and piece.is_friend(piece_copy):
-                        simulated_own_king = simulated_piece_copy
-
-            simulated_pieces.append(piece_copy)
-
-            if simulated_own_king is None:
-                if isinstance(piece_copy, King):
-                    simulated_own_king = piece_copy
-                else:
-                    return False  # Nincs királyunk
-
-            for piece in simulated_pieces:
-                if piece_copy.is_enemy(piece) and \
-                        piece.is_legal_move(simulated_own_king.row, simulated_own_king.col, simulated_pieces, False):
-                    return False  # Az ellenfél le tudná venni a királyunk, sakkban vagyunk
-        return True
+        if not (0 <= where_row <= 7 and 0 <= where_col <= 7):
+            return False
+
+        from_square, where_square = to_square(self.row, self.col), to_square(where_row, where_col)
+        moves = position.legal_moves_from(from_square) if handle_check else \
+            position.pseudo_legal_moves_from(from_square)
+        return any(rules.move_to_square(move) == where_square for move in moves)
+
+    def find_legal_move(self, where_row: int, where_col: int, promotion: Optional[str] = None) -> rules.Move:
+        """
+        :return: The rules core move of this piece to the specified position.
+        :raises ValueError: If it is not the piece's turn or the move is illegal.
+        """
+        if self.is_white != position.white_to_move:
+            raise ValueError(f"Not your turn!")
+        from_square = to_square(self.row, self.col)
+        if position.board[from_square] != self.letter:
+            raise ValueError(f"The position has no {self} on ({self.row}, {self.col}), it is out of date.")
+
+        move = position.find_move(from_square, to_square(where_row, where_col), promotion)
+        if move is None:
+            raise ValueError(f"Invalid move: ({where_row}, {where_col}) with {self.info()}")
+        return move
 
     def put(self, where_row: int, where_col: int) -> None:
         """
@@ -172,9 +222,13 @@ class Piece(ABC, pygame.sprite.Sprite):
         :param where_col:
         :return: Puts a given piece to the designed square.
         """
+        if square_index[self.row * 8 + self.col] is self:
+            square_index[self.row * 8 + self.col] = None
+
         self.row = where_row
         self.col = where_col
 
+        square_index[self.row * 8 + self.col] = self
         self.update_rect()
 
     def move_to(self, where_row: int, where_col: int) -> None:
@@ -184,32 +238,43 @@ class Piece(ABC, pygame.sprite.Sprite):
         :param where_col: The column of the specified position. Expected values from 0 to 7.
         :return:
         """
-        global en_passant_candidate
+        self.perform_move(self.find_legal_move(where_row, where_col))
 
-        if self.is_white != app.is_white_on_turn:
-            raise ValueError(f"Not your turn!")
+    def perform_move(self, move: rules.Move) -> None:
+        """
+        Makes the move on the rules core position, then mirrors it on the sprites (captures, castling rook,
+        promoted piece).
+        :param move: Legal move of this piece.
+        """
+        captured_piece = find_piece(*to_row_col(position.captured_square(move)))
+        is_castling = position.is_castling(move)
+        _, where_square, promotion = rules.decode_move(move)
+        where_row, where_col = to_row_col(where_square)
 
-        if not self.is_legal_move(where_row, where_col):
-            raise ValueError(f"Invalid move: ({where_row}, {where_col}) with {self.info()}")
+        position.make_move(move)
 
-        where_to_piece = find_piece(where_row, where_col)
-        if where_to_piece is not None:
-            print(f"Takes {where_to_piece} on {where_row}, {where_col}.")
-            where_to_piece.taken()
+        if captured_piece is not None and captured_piece is not self:
+            print(f"Takes {captured_piece} on {where_row}, {where_col}.")
+            captured_piece.taken()
         else:
             print(f"Moved to {where_row}, {where_col} empty square.")
 
-        en_passant_candidate = None
+        self.put(where_row, where_col)
 
-        self.row = where_row
-        self.col = where_col
+        if is_castling:
+            rook_from, rook_to = rules.castling_rook_squares(where_square)
+            rook = find_piece(*to_row_col(rook_from))
+            if rook is not None:
+                rook.put(*to_row_col(rook_to))
 
-        self.update_rect()
+        if promotion is not None:
+            promoted_piece = create_piece(promotion if self.is_white else promotion.lower(), where_row, where_col)
+            promoted_piece.add_to_list()
+            self.remove_from_list()
 
     def get_all_legal_moves(self) -> List[Optional[Tuple[int, int]]]:
-        return [(row, col) for col in range(8) for row in range(8)
-                if (find_piece(row, col) is None or self.is_enemy(find_piece(row, col))) and
-                self.is_legal_move(row, col)]
+        moves = position.legal_moves_from(to_square(self.row, self.col))
+        return list(dict.fromkeys(to_row_col(rules.move_to_square(move)) for move in moves))
 
     def is_equal(self, other: 'Piece') -> bool:
         """
@@ -273,18 +338,20 @@ class Piece(ABC, pygame.sprite.Sprite):
         return not other_piece.is_white == self.is_white
 
     def taken(self):
-        pieces_list.remove(self)
-        app.pieces_group.remove(self)
+        self.remove_from_list()
         print(f"Piece ({self}) taken from {self.row}, {self.col}.")
 
         del self
 
     def add_to_list(self) -> None:
         pieces_list.append(self)
+        square_index[self.row * 8 + self.col] = self
         app.pieces_group.add(self)
 
     def remove_from_list(self):
         pieces_list.remove(self)
+        if square_index[self.row * 8 + self.col] is self:
+            square_index[self.row * 8 + self.col] = None
         app.pieces_group.remove(self)
 
     def update(self):
@@ -305,6 +372,14 @@ class Piece(ABC, pygame.sprite.Sprite):
     def update_rect(self):
         self.rect.x, self.rect.y = calculate_piece_start_on_screen(self)
 
+    @property
+    def letter(self) -> str:
+        """
+        :return: The piece letter of the rules core, see create_piece().
+        """
+        letter = 'N' if isinstance(self, Knight) else f"{self}"[0].upper()
+        return letter if self.is_white else letter.lower()
+
     def info(self) -> str:
         name = f"{self}"[0].upper() + f"{self}"[1:]
         return f"{name}: color: {'white' if self.is_white else 'black'}, row: {self.row}, column: {self.col}."
@@ -325,30 +400,6 @@ class Knight(Piece):
     def __init__(self, row: int, col: int, is_white: bool):
         super().__init__(row, col, is_white)
 
-    def is_legal_move(self, where_row: int, where_col: int, pieces=None, handle_check: bool = True) -> bool:
-        handle_check_result = super().is_legal_move(where_row, where_col, handle_check=handle_check)
-
-        if not handle_check_result:
-            return False
-
-        if pieces is None:
-            pieces = pieces_list
-
-        where_to_square = find_piece(where_row, where_col, pieces)
-        if (where_to_square is None or self.is_enemy(where_to_square)) and \
-                ((abs(where_row - self.row) == 2 and abs(where_col - self.col) == 1) or
-                 (abs(where_row - self.row) == 1 and abs(where_col - self.col) == 2)):
-            return True
-
-        return False
-
-    def get_all_legal_moves(self) -> List[Tuple[int, int]]:
-        moves = [(self.row - 2, self.col - 1), (self.row - 1, self.col - 2), (self.row + 1, self.col - 2),
-                 (self.row + 2, self.col - 1), (self.row - 2, self.col + 1), (self.row - 1, self.col + 2),
-                 (self.row + 1, self.col + 2), (self.row + 2, self.col + 1)]
-
-        return [move for move in moves if self.is_legal_move(move[0], move[1])]
-
     def __str__(self) -> str:
         return f"Knight" if self._is_white else f"knight"
 
@@ -356,56 +407,23 @@ class Knight(Piece):
 class Pawn(Piece):
     def __init__(self, row: int, col: int, is_white: bool):
         super().__init__(row, col, is_white)
+        self.promotion_from_square: Optional[int] = None
 
     def move_to(self, where_row: int, where_col: int) -> None:
-        global en_passant_candidate
-        previous_row, previous_col = self.row, self.col
-        previous_en_passant_candidate = en_passant_candidate
-
-        super().move_to(where_row, where_col)
-
-        if self.col == previous_col and self.row == previous_row - 2 * self.color_modifier():
-            en_passant_candidate = self
-
-        if previous_en_passant_candidate is not None and previous_en_passant_candidate.col == self.col and \
-                previous_en_passant_candidate.row == self.row + 1 * self.color_modifier():
-            previous_en_passant_candidate.taken()
-
-    def is_legal_move(self, where_row: int, where_col: int, pieces=None, handle_check: bool = True) -> bool:
-        handle_check_result = super().is_legal_move(where_row, where_col, handle_check=handle_check)
+        if where_row != self.last_row():
+            super().move_to(where_row, where_col)
+            return
 
-        if not handle_check_result:
-            return False
-
-        if pieces is None:
-            pieces = pieces_list
-
-        if where_col == self.col:
-            if find_piece(self.row - 1 * self.color_modifier(), self.col, pieces) is None:
-                if where_row == self.row - 1 * self.color_modifier():
-                    return True
-
-                is_starting_position = self.row == (6 if self.is_white is not app.is_board_turned else 1)
-                if is_starting_position and where_row == self.row - 2 * self.color_modifier() and \
-                        find_piece(self.row - 2 * self.color_modifier(), self.col, pieces) is None:
-                    return True
-
-        where_to_piece: Optional[Piece] = find_piece(where_row, where_col, pieces)
-        if (where_col == self.col - 1 or where_col == self.col + 1) and \
-                where_row == self.row - 1 * self.color_modifier():
-            if where_to_piece is not None and self.is_enemy(where_to_piece):
-                return True
-            if en_passant_candidate is not None and en_passant_candidate.col == where_col and \
-                    en_passant_candidate.row == where_row + 1 * self.color_modifier():
-                return True
+        # The rules core move is made by promote(), when the promotion piece is already selected.
+        move = self.find_legal_move(where_row, where_col, 'Q')
 
-        return False
-
-    def get_all_legal_moves(self) -> List[Tuple[int, int]]:
-        moves = [(self.row - 1 * self.color_modifier(), self.col - 1), (self.row - 1 * self.color_modifier(), self.col),
-                 (self.row - 1 * self.color_modifier(), self.col + 1), (self.row - 2 * self.color_modifier(), self.col)]
+        where_to_piece = find_piece(where_row, where_col)
+        if where_to_piece is not None:
+            print(f"Takes {where_to_piece} on {where_row}, {where_col}.")
+            where_to_piece.taken()
 
-        return [move for move in moves if self.is_legal_move(move[0], move[1])]
+        self.promotion_from_square = rules.move_from_square(move)
+        self.put(where_row, where_col)
 
     def promote(self, promote_to: str) -> None:
         """
@@ -416,31 +434,41 @@ class Pawn(Piece):
             raise TypeError(f"Promoted_to parameter must be string, got {promote_to} with {type(promote_to)}.")
 
         promoted_piece: Piece
+        promotion_letter: str
         match promote_to:
             case None:
                 raise ValueError(f"Must select a promotion piece before promotion.")
             case "queen":
                 promoted_piece = Queen(self.row, self.col, self.is_white)
+                promotion_letter = 'Q'
             case "knight":
                 promoted_piece = Knight(self.row, self.col, self.is_white)
+                promotion_letter = 'N'
             case "rook":
                 promoted_piece = Rook(self.row, self.col, self.is_white)
+                promotion_letter = 'R'
             case "bishop":
                 promoted_piece = Bishop(self.row, self.col, self.is_white)
+                promotion_letter = 'B'
             case _:
                 raise ValueError(f"Promotion class not found. Got {promote_to}.")
 
-        app.pieces_group.add(promoted_piece)
-        pieces_list.append(promoted_piece)
+        if self.promotion_from_square is None:
+            raise ValueError(f"Promotion without a pawn move.")
+        position.make_move(position.find_move(self.promotion_from_square, to_square(self.row, self.col),
+                                              promotion_letter))
+        self.promotion_from_square = None
+
+        promoted_piece.add_to_list()
         app.selected_piece = promoted_piece
 
         self.taken()
 
     def color_modifier(self):
-        return 1 if self.is_white is not app.is_board_turned else -1
+        return 1 if self.is_white else -1
 
     def last_row(self) -> int:
-        return 0 if self.is_white is not app.is_board_turned else 7
+        return 0 if self.is_white else 7
 
     def __str__(self) -> str:
         return f"Pawn" if self._is_white else f"pawn"
@@ -449,91 +477,6 @@ class Pawn(Piece):
 class Rook(Piece):
     def __init__(self, row: int, col: int, is_white: bool):
         super().__init__(row, col, is_white)
-        self.moved = False
-
-    def is_legal_move(self, where_row: int, where_col: int, pieces=None, handle_check: bool = True) -> bool:
-        handle_check_result = super().is_legal_move(where_row, where_col, handle_check=handle_check)
-
-        if not handle_check_result:
-            return False
-
-        if pieces is None:
-            pieces = pieces_list
-
-        # 2 reszbol all: 1. el tudok-e jutni addig a pzicioig ahova el akarok jutni, 2. a pozicioba lephetek-e
-        # sor: eljutas a pozicioig
-        if where_row == self.row and 0 <= where_col <= 7:
-            if self.col == where_col:
-                # print("Ugyanaz a row és oszlop is.")
-                return False
-
-            squares = []
-            col_tmp = self.col
-            if self.col < where_col:
-                while col_tmp < where_col:
-                    col_tmp += 1
-                    squares.append(col_tmp)
-            if self.col > where_col:
-                while col_tmp > where_col:
-                    col_tmp -= 1
-                    squares.append(col_tmp)
-            squares.pop()
-
-            for square in squares:
-                where_to_piece = find_piece(self.row, square, pieces)
-                if where_to_piece is not None and not self.is_equal(where_to_piece):
-                    # print("square-nel akadtam el.")
-                    return False
-
-            # pozicio
-            piece = find_piece(where_row, where_col, pieces)
-            if piece is not None and not self.is_enemy(piece):
-                # print("Nem mukodik a konkret mezo vizsgalat.")
-                return False
-            else:
-                return True
-
-        # oszlop: eljutas a pozicioig
-        if where_col == self.col and 0 <= where_row <= 7:
-            if self.row == where_row:
-                return False
-
-            squares = []
-            row_tmp = self.row
-            if self.row < where_row:
-                while row_tmp < where_row:
-                    row_tmp += 1
-                    squares.append(row_tmp)
-            if self.row > where_row:
-                while row_tmp > where_row:
-                    row_tmp -= 1
-                    squares.append(row_tmp)
-                    print("Ez a squares tartalma:", squares)
-            squares.pop()
-            print("Ez a squares tartalma pop után:", squares)
-
-            for square in squares:
-                # print(f"kulso iteráció : {square}")
-                where_to_piece = find_piece(square, self.col, pieces)
-                if where_to_piece is not None and not self.is_equal(where_to_piece):
-                    # print("Ez a where_to_piece", where_to_piece)
-                    # print(f"If-belül ahol elakadok : {square}")
-                    # print("square-nel akadtam el.")
-                    return False  # itt van egy ideiglenes logikai változtatás
-
-                # pozicio
-            piece = find_piece(where_row, where_col, pieces)
-            if piece is not None and not self.is_enemy(piece):
-                # print("Nem mukodik a konkret mezo vizsgalat.")
-                return False
-            else:
-                return True
-
-    def get_all_legal_moves(self) -> List[Optional[Tuple[int, int]]]:
-        legal_moves_list = [(self.row, i) for i in range(8) if self.is_legal_move(self.row, i)]
-        legal_moves_list.extend([(i, self.col) for i in range(8) if self.is_legal_move(i, self.col)])
-
-        return legal_moves_list
 
     def __str__(self) -> str:
         return f"Rook" if self._is_white else f"rook"
@@ -543,39 +486,6 @@ class Bishop(Piece):
     def __init__(self, row: int, col: int, is_white: bool):
         super().__init__(row, col, is_white)
 
-    def is_legal_move(self, where_row: int, where_col: int, pieces=None, handle_check: bool = True) -> bool:
-        handle_check_result = super().is_legal_move(where_row, where_col, handle_check=handle_check)
-
-        if not handle_check_result:
-            return False
-
-        if pieces is None:
-            pieces = pieces_list
-
-        if abs(where_row - self.row) != abs(where_col - self.col):
-            return False
-        if where_row > self.row:
-            next_row = 1
-        else:
-            next_row = -1
-        if where_col > self.col:
-            next_col = 1
-        else:
-            next_col = -1
-        copy_row = self.row
-        copy_col = self.col
-        where_to_square = find_piece(where_row, where_col, pieces)
-        while (copy_row != where_row and copy_col != where_col):
-            copy_row += next_row
-            copy_col += next_col
-            if copy_row == where_row and copy_col == where_col:
-                if where_to_square is None or self.is_enemy(where_to_square):
-                    return True
-                else:
-                    return False
-            if find_piece(copy_row, copy_col, pieces) is not None:
-                return False
-
     def __str__(self) -> str:
         return f"Bishop" if self._is_white else f"bishop"
 
@@ -583,82 +493,14 @@ class Bishop(Piece):
 class King(Piece):
     def __init__(self, row: int, col: int, is_white: bool):
         super().__init__(row, col, is_white)
-        self.moved = False
-
-    def is_legal_move(self, where_row: int, where_col: int, pieces=None, handle_check: bool = True) -> bool:
-        handle_check_result = super().is_legal_move(where_row, where_col, handle_check=handle_check)
-
-        if not handle_check_result:
-            return False
-
-        if pieces is None:
-            pieces = pieces_list
-
-        if where_row == self.row and where_col == self.col:
-            return False
-
-        rook1 = find_piece(self.row, 0)
-        rook2 = find_piece(self.row, 7)
-        where_to_square = find_piece(where_row, where_col, pieces)
-        if (-1 <= (where_row - self.row) <= 1 and -1 <= (where_col - self.col) <= 1) or (
-                where_col + 2 and where_row == self.row) or (
-                where_col - 2 and where_row == self.row) and (
-                (isinstance(rook1, Rook) and not rook1.moved) or (isinstance(rook2, Rook) and not rook2.moved) and (
-                self.is_able_to_castle(rook1) or self.is_able_to_castle(rook2))):
-            # print("Első if megvan")
-            if where_to_square is None or self.is_enemy(where_to_square):
-                # print("Na ez itt a kerdes.")
-                return True
-        # print("Nem megyek be az if-be sajnos.")
-        return False
-
-    def get_all_legal_moves(self) -> List[Optional[Tuple[int, int]]]:
-        moves = [(self.row - 1, self.col - 1), (self.row - 1, self.col), (self.row - 1, self.col + 1),
-                 (self.row, self.col - 1), (self.row, self.col + 1), (self.row + 1, self.col - 1),
-                 (self.row + 1, self.col), (self.row + 1, self.col + 1), (self.row, self.col + 2),
-                 (self.row, self.col - 2)]
-
-        for move in moves:
-            if (move[0] < 0 or move[0] > 7) or (move[1] < 0 or move[1] > 7):
-                moves.remove(move)  # todo: remélem ez megoldja a gondokat.(megoldotta)
-
-        return [move for move in moves if self.is_legal_move(move[0], move[1])]
 
     def is_in_check(self, pieces=None):
-        if pieces is None:
-            pieces = pieces_list
-
-        for piece in pieces:
-            if self.is_enemy(piece) and piece.is_legal_move(self.row, self.col):
-                return True
-
-        return False
+        return position.is_square_attacked(to_square(self.row, self.col), not self.is_white)
 
     def is_able_to_castle(self, rook: 'Rook'):
-        if self.moved or rook.moved:
-            return False
-
-        if self.is_in_check():
-            return False
-
-        if is_square_under_attack(self.row, self.col + 1):
-            return False
-        if is_square_under_attack(self.row, self.col + 2):
-            return False
-        if is_square_under_attack(self.row, self.col - 1):
-            return False
-        if is_square_under_attack(self.row, self.col - 2):
-            return False
-
-        start_col = min(self.col, rook.col) + 1
-        end_col = max(self.col, rook.col)
-
-        # Ellenőrzés, hogy az összes mező üres-e és nincs-e támadás alatt közöttük
-        for col in range(start_col, end_col):
-            if find_piece(self.row, col) or is_square_under_attack(self.row, col):
-                return False
-
-        return True
+        king_square = to_square(self.row, self.col)
+        direction = 1 if to_square(rook.row, rook.col) > king_square else -1
+        return position.find_move(king_square, king_square + 2 * direction) is not None
 
     def __str__(self) -> str:
         return f"King" if self._is_white else f"king"
@@ -668,46 +510,5 @@ class Queen(Piece):
     def __init__(self, row: int, col: int, is_white: bool):
         super().__init__(row, col, is_white)
 
-    def is_legal_move(self, where_row: int, where_col: int, pieces=None, handle_check: bool = True) -> bool:
-        handle_check_result = super().is_legal_move(where_row, where_col, handle_check=handle_check)
-
-        if not handle_check_result:
-            return False
-
-        if pieces is None:
-            pieces = pieces_list
-
-        if (abs(where_row - self.row) == abs(where_col - self.col)) or (where_row == self.row or where_col == self.col):
-            if where_row > self.row:
-                next_row = 1
-            elif where_row == self.row:
-                next_row = 0
-            else:
-                next_row = -1
-            if where_col > self.col:
-                next_col = 1
-            elif where_col == self.col:
-                next_col = 0
-            else:
-                next_col = -1
-
-            copy_row = self.row
-            copy_col = self.col
-
-            where_to_square = find_piece(where_row, where_col, pieces)
-
-            while (copy_row != where_row or copy_col != where_col):
-                copy_row += next_row
-                copy_col += next_col
-                if copy_row == where_row and copy_col == where_col:
-                    if where_to_square is None or self.is_enemy(where_to_square):
-                        return True
-                    else:
-                        return False
-                if find_piece(copy_row, copy_col, pieces) is not None:
-                    return False
-
-        return False
-
     def __str__(self) -> str:
         return f"Queen" if self._is_white else f"queen"
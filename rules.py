@@ -0,0 +1,898 @@
+import random
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from get_all_legal_moves import KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, ROOK_MASKS, BISHOP_MASKS, BETWEEN, \
+    rook_attacks, bishop_attacks, iterate_bits
+
+"""
+Contains the rules core: position, legal move generation and make-move. (No pygame, can run headless.)
+
+Squares are numbered 0..63 as row * 8 + col, where row 0 is black's back rank (the 8th rank) and col 0 is the a file.
+Pieces are stored as single letters: uppercase for white, lowercase for black (like Piece.__str__).
+Besides the board list, every piece letter and both colors have a 64-bit bitboard (bit index is the square), and
+moves are generated from the precomputed attack tables of get_all_legal_moves.
+"""
+
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+
+PROMOTION_PIECES = ('Q', 'N', 'R', 'B')
+
+# Moves are packed into 16-bit ints: from square (bits 0-5), to square (bits 6-11) and flags (bits 12-15).
+# The flags: bit 3 is set for captures, bit 2 for promotions (bits 0-1 are then the index in PROMOTION_PIECES),
+# otherwise bits 0-1 are one of the special moves.
+Move = int
+MOVE_DOUBLE_PUSH = 1
+MOVE_CASTLING = 2
+MOVE_PROMOTION = 4
+MOVE_CAPTURE = 8
+MOVE_EN_PASSANT = MOVE_CAPTURE | 3
+
+piece_values = {
+    'Pawn': 1,
+    'Rook': 5,
+    'Knight': 3,
+    'Bishop': 3,
+    'Queen': 9,
+    'King': 1
+}
+
+piece_names = {
+    'P': 'Pawn',
+    'N': 'Knight',
+    'B': 'Bishop',
+    'R': 'Rook',
+    'Q': 'Queen',
+    'K': 'King'
+}
+
+PIECE_LETTERS = {True: 'PNBRQK', False: 'pnbrqk'}
+FULL_BOARD = (1 << 64) - 1
+
+START_BOARD = "rnbqkbnr" \
+              "pppppppp" \
+              "........" \
+              "........" \
+              "........" \
+              "........" \
+              "PPPPPPPP" \
+              "RNBQKBNR"
+
+# Castling rights lost when a piece moves from or to the given square.
+CASTLING_MASKS = {
+    square: rights for square, rights in (
+        (0, BLACK_QUEENSIDE), (4, BLACK_KINGSIDE | BLACK_QUEENSIDE), (7, BLACK_KINGSIDE),
+        (56, WHITE_QUEENSIDE), (60, WHITE_KINGSIDE | WHITE_QUEENSIDE), (63, WHITE_KINGSIDE)
+    )
+}
+
+
+# Zobrist keys: random 64-bit numbers xor-ed together into the position hash. The seed is fixed, so the keys (and the
+# hashes) are the same in every run, which keeps stored hashes usable across processes.
+_zobrist_random = random.Random(0x5EED)
+ZOBRIST_PIECES = {letter: [_zobrist_random.getrandbits(64) for _ in range(64)] for letter in 'PNBRQKpnbrqk'}
+ZOBRIST_BLACK_TO_MOVE = _zobrist_random.getrandbits(64)
+ZOBRIST_CASTLING = [_zobrist_random.getrandbits(64) for _ in range(16)]  # Indexed by the castling rights bitmask.
+ZOBRIST_EN_PASSANT = [_zobrist_random.getrandbits(64) for _ in range(8)]  # Indexed by the file of the target.
+
+# Piece-square bonuses in centipawns for white, indexed by square (row 0 is the 8th rank). Black uses square ^ 56.
+PIECE_SQUARE_TABLES = {
+    'P': [0, 0, 0, 0, 0, 0, 0, 0,
+          50, 50, 50, 50, 50, 50, 50, 50,
+          10, 10, 20, 30, 30, 20, 10, 10,
+          5, 5, 10, 25, 25, 10, 5, 5,
+          0, 0, 0, 20, 20, 0, 0, 0,
+          5, -5, -10, 0, 0, -10, -5, 5,
+          5, 10, 10, -20, -20, 10, 10, 5,
+          0, 0, 0, 0, 0, 0, 0, 0],
+    'N': [-50, -40, -30, -30, -30, -30, -40, -50,
+          -40, -20, 0, 0, 0, 0, -20, -40,
+          -30, 0, 10, 15, 15, 10, 0, -30,
+          -30, 5, 15, 20, 20, 15, 5, -30,
+          -30, 0, 15, 20, 20, 15, 0, -30,
+          -30, 5, 10, 15, 15, 10, 5, -30,
+          -40, -20, 0, 5, 5, 0, -20, -40,
+          -50, -40, -30, -30, -30, -30, -40, -50],
+    'B': [-20, -10, -10, -10, -10, -10, -10, -20,
+          -10, 0, 0, 0, 0, 0, 0, -10,
+          -10, 0, 5, 10, 10, 5, 0, -10,
+          -10, 5, 5, 10, 10, 5, 5, -10,
+          -10, 0, 10, 10, 10, 10, 0, -10,
+          -10, 10, 10, 10, 10, 10, 10, -10,
+          -10, 5, 0, 0, 0, 0, 5, -10,
+          -20, -10, -10, -10, -10, -10, -10, -20],
+    'R': [0, 0, 0, 0, 0, 0, 0, 0,
+          5, 10, 10, 10, 10, 10, 10, 5,
+          -5, 0, 0, 0, 0, 0, 0, -5,
+          -5, 0, 0, 0, 0, 0, 0, -5,
+          -5, 0, 0, 0, 0, 0, 0, -5,
+          -5, 0, 0, 0, 0, 0, 0, -5,
+          -5, 0, 0, 0, 0, 0, 0, -5,
+          0, 0, 0, 5, 5, 0, 0, 0],
+    'Q': [-20, -10, -10, -5, -5, -10, -10, -20,
+          -10, 0, 0, 0, 0, 0, 0, -10,
+          -10, 0, 5, 5, 5, 5, 0, -10,
+          -5, 0, 5, 5, 5, 5, 0, -5,
+          0, 0, 5, 5, 5, 5, 0, -5,
+          -10, 5, 5, 5, 5, 5, 0, -10,
+          -10, 0, 5, 0, 0, 0, 0, -10,
+          -20, -10, -10, -5, -5, -10, -10, -20],
+    'K': [-30, -40, -40, -50, -50, -40, -40, -30,
+          -30, -40, -40, -50, -50, -40, -40, -30,
+          -30, -40, -40, -50, -50, -40, -40, -30,
+          -30, -40, -40, -50, -50, -40, -40, -30,
+          -20, -30, -30, -40, -40, -30, -30, -20,
+          -10, -20, -20, -20, -20, -20, -20, -10,
+          20, 20, 0, 0, 0, 0, 20, 20,
+          20, 30, 10, 0, 0, 10, 30, 20],
+}
+
+# Signed value of every piece letter in piece_values units: positive for white, negative for black, 0 for the kings.
+MATERIAL_VALUES = {letter: (0 if letter in 'Kk' else piece_values[piece_names[letter.upper()]] *
+                            (1 if letter.isupper() else -1))
+                   for letter in 'PNBRQKpnbrqk'}
+
+# Signed centipawn score of every piece letter on every square (material + piece-square bonus), white's point of view.
+PIECE_SQUARE_SCORES = {letter: [(MATERIAL_VALUES[letter] * 100 +
+                                 PIECE_SQUARE_TABLES[letter][sq]) if letter.isupper() else
+                                (MATERIAL_VALUES[letter] * 100 - PIECE_SQUARE_TABLES[letter.upper()][sq ^ 56])
+                                for sq in range(64)]
+                       for letter in 'PNBRQKpnbrqk'}
+
+
+def square(row: int, col: int) -> int:
+    return row * 8 + col
+
+
+def square_row(sq: int) -> int:
+    return sq >> 3
+
+
+def square_col(sq: int) -> int:
+    return sq & 7
+
+
+def square_name(sq: int) -> str:
+    """
+    :return: Algebraic name of the square, e.g. 'e4'.
+    """
+    return f"{chr(97 + square_col(sq))}{8 - square_row(sq)}"
+
+
+def parse_square(name: str) -> int:
+    """
+    :param name: Algebraic name of the square, e.g. 'e4'.
+    :return: The square index.
+    """
+    if len(name) != 2 or name[0] not in 'abcdefgh' or name[1] not in '12345678':
+        raise ValueError(f"Invalid square name: {name}")
+    return square(8 - int(name[1]), ord(name[0]) - 97)
+
+
+def encode_move(from_square: int, to_square: int, promotion: Optional[str] = None, flags: int = 0) -> 'Move':
+    """
+    :param promotion: 'Q' | 'N' | 'R' | 'B' or None.
+    :param flags: MOVE_CAPTURE, MOVE_DOUBLE_PUSH, MOVE_CASTLING or MOVE_EN_PASSANT (the promotion is added to it).
+    :return: The packed move.
+    """
+    if promotion is not None:
+        flags |= MOVE_PROMOTION | PROMOTION_PIECES.index(promotion)
+    return from_square | to_square << 6 | flags << 12
+
+
+def move_from_square(move: 'Move') -> int:
+    return move & 63
+
+
+def move_to_square(move: 'Move') -> int:
+    return move >> 6 & 63
+
+
+def move_flags(move: 'Move') -> int:
+    return move >> 12
+
+
+def move_promotion(move: 'Move') -> Optional[str]:
+    """
+    :return: 'Q' | 'N' | 'R' | 'B' (always uppercase) or None if the move is not a promotion.
+    """
+    flags = move >> 12
+    return PROMOTION_PIECES[flags & 3] if flags & MOVE_PROMOTION else None
+
+
+def decode_move(move: 'Move') -> Tuple[int, int, Optional[str]]:
+    """
+    :return: (from square, to square, promotion) of a packed move, e.g. for the UI.
+    """
+    return move & 63, move >> 6 & 63, move_promotion(move)
+
+
+def move_to_uci(move: 'Move') -> str:
+    """
+    :return: The move in coordinate notation, e.g. 'e2e4' or 'e7e8q'.
+    """
+    from_square, to_square, promotion = decode_move(move)
+    return f"{square_name(from_square)}{square_name(to_square)}{promotion.lower() if promotion is not None else ''}"
+
+
+def is_white_piece(piece: str) -> bool:
+    return piece.isupper()
+
+
+def castling_rook_squares(king_to: int) -> Tuple[int, int]:
+    """
+    :param king_to: Target square of the castling king.
+    :return: The (from, to) squares of the rook taking part in the castling.
+    """
+    if square_col(king_to) == 6:
+        return king_to + 1, king_to - 1
+    return king_to - 2, king_to + 1
+
+
+class Undo(NamedTuple):
+    """Everything make_move() overwrites, so unmake_move() can restore it."""
+    move: Move
+    moved_piece: str
+    captured: Optional[str]
+    captured_square: int
+    castling_rights: int
+    en_passant: Optional[int]
+    halfmove_clock: int
+    last_move: Optional[Move]
+    hash: int
+
+
+class Position:
+    def __init__(self):
+        self.board: List[Optional[str]] = [None] * 64
+        self.bitboards: Dict[str, int] = {letter: 0 for letter in 'PNBRQKpnbrqk'}
+        self.occupancy: Dict[bool, int] = {True: 0, False: 0}  # Bitboard of all pieces of a color (is_white).
+        self.white_to_move = True
+        self.castling_rights = 0
+        self.en_passant: Optional[int] = None  # The square skipped by the last double pawn push.
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        self.last_move: Optional[Move] = None
+        self.history: List[Undo] = []  # Reversible state of the made moves, used by unmake_move().
+        self.hash = 0  # Zobrist hash, updated incrementally by make_move() and unmake_move().
+        # Evaluation, also updated incrementally with every put and removed piece (white's point of view):
+        self.material = 0  # Material balance in piece_values units.
+        self.score = 0  # Material and piece-square bonuses in centipawns.
+        # The legal moves of the side to move by from square, and the hash of the position they belong to.
+        self._legal_move_set: Dict[int, List[Move]] = {}
+        self._legal_move_set_hash: Optional[int] = None
+
+    @classmethod
+    def initial(cls) -> 'Position':
+        """
+        :return: The standard starting position.
+        """
+        position = cls()
+        position.set_board([None if letter == '.' else letter for letter in START_BOARD])
+        position.castling_rights = WHITE_KINGSIDE | WHITE_QUEENSIDE | BLACK_KINGSIDE | BLACK_QUEENSIDE
+        position.hash = position.compute_hash()
+        return position
+
+    @classmethod
+    def from_fen(cls, fen: str) -> 'Position':
+        """
+        :param fen: Position in Forsyth-Edwards Notation. The move counters are optional, but only both together.
+        :return: The parsed position.
+        """
+        fields = fen.split()
+        if len(fields) not in (4, 6):
+            raise ValueError(f"FEN must have 4 fields, or 6 with the move counters, got {len(fields)}: {fen}")
+
+        ranks = fields[0].split('/')
+        if len(ranks) != 8:
+            raise ValueError(f"FEN must describe 8 ranks, got {len(ranks)}: {fields[0]}")
+        board: List[Optional[str]] = []
+        for rank in ranks:
+            rank_start = len(board)
+            for letter in rank:
+                if letter in '12345678':
+                    board.extend([None] * int(letter))
+                elif letter.upper() in piece_names:
+                    board.append(letter)
+                else:
+                    raise ValueError(f"Invalid piece letter in FEN: {letter}")
+            if len(board) - rank_start != 8:
+                raise ValueError(f"Every rank must describe 8 squares, got {len(board) - rank_start}: {rank}")
+
+        if board.count('K') != 1 or board.count('k') != 1:
+            raise ValueError(f"FEN must have exactly one king of each color: {fields[0]}")
+        if any(piece in ('P', 'p') for piece in board[:8] + board[56:]):
+            raise ValueError(f"Pawns can not stand on the 1st or the 8th rank: {fields[0]}")
+        if fields[1] not in ('w', 'b'):
+            raise ValueError(f"Invalid side to move in FEN: {fields[1]}")
+        if fields[2] != '-' and (not fields[2] or set(fields[2]) - set('KQkq')):
+            raise ValueError(f"Invalid castling rights in FEN: {fields[2]}")
+
+        position = cls()
+        position.set_board(board)
+        position.white_to_move = fields[1] == 'w'
+        for letter, right in zip('KQkq', (WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE)):
+            if letter in fields[2]:
+                # The king and the rook of the right must not have moved yet.
+                if any(rights & right and board[square] != START_BOARD[square]
+                       for square, rights in CASTLING_MASKS.items()):
+                    raise ValueError(f"Castling right {letter} without its king and rook at home: {fen}")
+                position.castling_rights |= right
+        if fields[3] != '-':
+            position.en_passant = parse_square(fields[3])
+            if not position._is_valid_en_passant():
+                raise ValueError(f"No pawn can be captured en passant on {fields[3]}: {fen}")
+        if len(fields) == 6:
+            position.halfmove_clock = int(fields[4])
+            position.fullmove_number = int(fields[5])
+            if position.halfmove_clock < 0 or position.fullmove_number < 1:
+                raise ValueError(f"Invalid move counters in FEN: {fields[4]} {fields[5]}")
+        if position.is_in_check(not position.white_to_move):
+            raise ValueError(f"The side not to move must not be in check: {fen}")
+        position.hash = position.compute_hash()
+        return position
+
+    def _is_valid_en_passant(self) -> bool:
+        """
+        :return: True if the en passant square is empty and was just skipped by a double push of the opponent's pawn.
+        """
+        sq = self.en_passant
+        direction = -8 if self.white_to_move else 8  # Towards the pushing side's own back rank.
+        if square_row(sq) != (2 if self.white_to_move else 5):
+            return False
+        pawn = 'p' if self.white_to_move else 'P'
+        return self.board[sq] is None and self.board[sq + direction] is None and self.board[sq - direction] == pawn
+
+    def to_fen(self) -> str:
+        """
+        :return: The position in Forsyth-Edwards Notation, with the move counters.
+        """
+        ranks = []
+        for row in range(8):
+            rank, empty = '', 0
+            for piece in self.board[row * 8:row * 8 + 8]:
+                if piece is None:
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                rank += piece
+            ranks.append(rank + str(empty) if empty else rank)
+
+        castling = ''.join(letter for letter, right in zip('KQkq', (WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE,
+                                                                     BLACK_QUEENSIDE))
+                           if self.castling_rights & right)
+        en_passant = square_name(self.en_passant) if self.en_passant is not None else '-'
+        return f"{'/'.join(ranks)} {'w' if self.white_to_move else 'b'} {castling or '-'} {en_passant} " \
+               f"{self.halfmove_clock} {self.fullmove_number}"
+
+    def set_board(self, board: List[Optional[str]]) -> None:
+        """
+        Replaces all pieces of the position and rebuilds the bitboards.
+        :param board: 64 piece letters or None, indexed by square.
+        """
+        if len(board) != 64:
+            raise ValueError(f"Board must have 64 squares, got {len(board)}.")
+        self.board = [None] * 64
+        self.bitboards = {letter: 0 for letter in 'PNBRQKpnbrqk'}
+        self.occupancy = {True: 0, False: 0}
+        self.material = 0
+        self.score = 0
+        for sq, piece in enumerate(board):
+            if piece is not None:
+                self._put_piece(sq, piece)
+        self.hash = self.compute_hash()
+
+    def compute_hash(self) -> int:
+        """
+        Computes the Zobrist hash from scratch. (make_move() keeps self.hash up to date without this.)
+        :return: Hash of the piece placement, side to move, castling rights and capturable en passant square.
+        """
+        hash_value = ZOBRIST_CASTLING[self.castling_rights] ^ self._en_passant_key()
+        if not self.white_to_move:
+            hash_value ^= ZOBRIST_BLACK_TO_MOVE
+        for sq, piece in enumerate(self.board):
+            if piece is not None:
+                hash_value ^= ZOBRIST_PIECES[piece][sq]
+        return hash_value
+
+    def _en_passant_key(self) -> int:
+        """
+        The en passant square is only part of the hash if a pawn of the side to move could capture there, so the
+        same positions get the same hash whether or not the last move was a double push.
+        """
+        if self.en_passant is None:
+            return 0
+        capturing_pawns = self.bitboards['P' if self.white_to_move else 'p']
+        if PAWN_ATTACKS[not self.white_to_move][self.en_passant] & capturing_pawns:
+            return ZOBRIST_EN_PASSANT[square_col(self.en_passant)]
+        return 0
+
+    def copy(self) -> 'Position':
+        position = Position()
+        position.board = self.board[:]
+        position.bitboards = self.bitboards.copy()
+        position.occupancy = self.occupancy.copy()
+        position.white_to_move = self.white_to_move
+        position.castling_rights = self.castling_rights
+        position.en_passant = self.en_passant
+        position.halfmove_clock = self.halfmove_clock
+        position.fullmove_number = self.fullmove_number
+        position.last_move = self.last_move
+        position.history = self.history[:]
+        position.hash = self.hash
+        position.material = self.material
+        position.score = self.score
+        return position
+
+    def _put_piece(self, sq: int, piece: str) -> None:
+        bit = 1 << sq
+        self.board[sq] = piece
+        self.bitboards[piece] |= bit
+        self.occupancy[piece.isupper()] |= bit
+        self.hash ^= ZOBRIST_PIECES[piece][sq]
+        self.material += MATERIAL_VALUES[piece]
+        self.score += PIECE_SQUARE_SCORES[piece][sq]
+
+    def _remove_piece(self, sq: int) -> Optional[str]:
+        piece = self.board[sq]
+        if piece is not None:
+            bit = 1 << sq
+            self.board[sq] = None
+            self.bitboards[piece] ^= bit
+            self.occupancy[piece.isupper()] ^= bit
+            self.hash ^= ZOBRIST_PIECES[piece][sq]
+            self.material -= MATERIAL_VALUES[piece]
+            self.score -= PIECE_SQUARE_SCORES[piece][sq]
+        return piece
+
+    def piece_at(self, row: int, col: int) -> Optional[str]:
+        return self.board[square(row, col)]
+
+    def king_square(self, is_white: bool) -> Optional[int]:
+        king = self.bitboards['K' if is_white else 'k']
+        return king.bit_length() - 1 if king else None
+
+    def is_square_attacked(self, sq: int, by_white: bool, occupied: Optional[int] = None) -> bool:
+        """
+        Is the square attacked by any piece of the given color? Pins and checks of the attacker are ignored.
+        :param sq: The examined square.
+        :param by_white: Color of the attacking side.
+        :param occupied: Occupancy bitboard used for the sliders. Optional: If not given, then the current one.
+        :return: True if at least one piece of by_white attacks the square.
+        """
+        bitboards = self.bitboards
+        pawn, knight, bishop, rook, queen, king = PIECE_LETTERS[by_white]
+
+        if KNIGHT_ATTACKS[sq] & bitboards[knight] or KING_ATTACKS[sq] & bitboards[king] or \
+                PAWN_ATTACKS[not by_white][sq] & bitboards[pawn]:
+            return True
+
+        if occupied is None:
+            occupied = self.occupancy[True] | self.occupancy[False]
+        queens = bitboards[queen]
+        return bool(rook_attacks(sq, occupied) & (bitboards[rook] | queens) or
+                    bishop_attacks(sq, occupied) & (bitboards[bishop] | queens))
+
+    def attackers(self, sq: int, piece: str) -> int:
+        """
+        :param sq: The examined square.
+        :param piece: Piece letter of the attackers.
+        :return: Bitboard of the pieces of the given letter that attack the square. Pins and checks are ignored.
+        """
+        if piece in 'Pp':
+            return PAWN_ATTACKS[not is_white_piece(piece)][sq] & self.bitboards[piece]
+        occupied = self.occupancy[True] | self.occupancy[False]
+        return self._piece_attacks(piece.upper(), sq, occupied) & self.bitboards[piece]
+
+    def is_in_check(self, is_white: Optional[bool] = None) -> bool:
+        """
+        :param is_white: Color of the examined king. Optional: If not given, then the side to move.
+        :return: True if the king of the given color is attacked.
+        """
+        if is_white is None:
+            is_white = self.white_to_move
+        king_sq = self.king_square(is_white)
+        return king_sq is not None and self.is_square_attacked(king_sq, not is_white)
+
+    def pseudo_legal_moves_from(self, from_square: int) -> List[Move]:
+        """
+        Generates the moves of the piece on the given square without caring about the own king's safety.
+        :param from_square: Square of the moving piece. The piece does not have to be of the side to move.
+        :return: List of Moves. Empty if the square is empty.
+        """
+        piece = self.board[from_square]
+        if piece is None:
+            return []
+
+        is_white = is_white_piece(piece)
+        kind = piece.upper()
+        own = self.occupancy[is_white]
+        occupied = own | self.occupancy[not is_white]
+
+        if kind == 'P':
+            return self._pawn_moves(from_square, is_white, occupied, FULL_BOARD, False)
+
+        enemy = self.occupancy[not is_white]
+        moves = [from_square | to_square << 6 | (enemy >> to_square & 1) << 15
+                 for to_square in iterate_bits(self._piece_attacks(kind, from_square, occupied) & ~own)]
+        if kind == 'K':
+            moves.extend(self._castling_moves(from_square, is_white))
+        return moves
+
+    @staticmethod
+    def _piece_attacks(kind: str, from_square: int, occupied: int) -> int:
+        if kind == 'N':
+            return KNIGHT_ATTACKS[from_square]
+        if kind == 'B':
+            return bishop_attacks(from_square, occupied)
+        if kind == 'R':
+            return rook_attacks(from_square, occupied)
+        if kind == 'Q':
+            return rook_attacks(from_square, occupied) | bishop_attacks(from_square, occupied)
+        return KING_ATTACKS[from_square]
+
+    def _pawn_moves(self, from_square: int, is_white: bool, occupied: int, target_mask: int,
+                    legal_only: bool) -> List[Move]:
+        forward, start_row, last_row = (-8, 6, 0) if is_white else (8, 1, 7)
+        targets = 0
+
+        one_step = from_square + forward
+        two_steps = -1
+        if 0 <= one_step <= 63 and not occupied & (1 << one_step):
+            targets |= 1 << one_step
+            if square_row(from_square) == start_row and not occupied & (1 << one_step + forward):
+                two_steps = one_step + forward
+                targets |= 1 << two_steps
+
+        enemy = self.occupancy[not is_white]
+        targets |= PAWN_ATTACKS[is_white][from_square] & enemy
+        targets &= target_mask
+
+        moves = []
+        for to_square in iterate_bits(targets):
+            move = from_square | to_square << 6 | (enemy >> to_square & 1) << 15
+            if square_row(to_square) == last_row:
+                moves.extend(move | (MOVE_PROMOTION | index) << 12 for index in range(len(PROMOTION_PIECES)))
+            elif to_square == two_steps:
+                moves.append(move | MOVE_DOUBLE_PUSH << 12)
+            else:
+                moves.append(move)
+
+        # En passant removes a pawn from a different square than the target, so its legality is checked by playing it.
+        if self.en_passant is not None and is_white == self.white_to_move and \
+                PAWN_ATTACKS[is_white][from_square] & (1 << self.en_passant):
+            move = from_square | self.en_passant << 6 | MOVE_EN_PASSANT << 12
+            if not legal_only or self.is_legal(move):
+                moves.append(move)
+        return moves
+
+    def _castling_moves(self, king_square: int, is_white: bool) -> List[Move]:
+        home = 60 if is_white else 4
+        if king_square != home:
+            return []
+        kingside, queenside = (WHITE_KINGSIDE, WHITE_QUEENSIDE) if is_white else (BLACK_KINGSIDE, BLACK_QUEENSIDE)
+        rook = 'R' if is_white else 'r'
+        board = self.board
+        moves = []
+
+        if self.castling_rights & (kingside | queenside) == 0 or self.is_square_attacked(home, not is_white):
+            return moves
+
+        if self.castling_rights & kingside and board[home + 3] == rook and \
+                board[home + 1] is None and board[home + 2] is None and \
+                not self.is_square_attacked(home + 1, not is_white) and \
+                not self.is_square_attacked(home + 2, not is_white):
+            moves.append(home | (home + 2) << 6 | MOVE_CASTLING << 12)
+
+        if self.castling_rights & queenside and board[home - 4] == rook and \
+                board[home - 1] is None and board[home - 2] is None and board[home - 3] is None and \
+                not self.is_square_attacked(home - 1, not is_white) and \
+                not self.is_square_attacked(home - 2, not is_white):
+            moves.append(home | (home - 2) << 6 | MOVE_CASTLING << 12)
+
+        return moves
+
+    def pseudo_legal_moves(self) -> List[Move]:
+        moves = []
+        for sq in iterate_bits(self.occupancy[self.white_to_move]):
+            moves.extend(self.pseudo_legal_moves_from(sq))
+        return moves
+
+    def is_legal(self, move: Move) -> bool:
+        """
+        Checks whether the (pseudo-legal) move leaves the own king in check.
+        The move is made and unmade in place, so the position is the same afterward.
+        """
+        piece = self.board[move & 63]
+        if piece is None:
+            return False
+        is_white = is_white_piece(piece)
+
+        white_to_move = self.white_to_move
+        self.white_to_move = is_white
+        self.make_move(move)
+        is_legal = not self.is_in_check(is_white)
+        self.unmake_move()
+        self.white_to_move = white_to_move
+        return is_legal
+
+    def checks_and_pins(self, is_white: bool) -> Tuple[int, int, Dict[int, int]]:
+        """
+        Finds the pieces giving check to the king of the given color and the own pieces pinned to it.
+        :param is_white: Color of the examined king.
+        :return: (checkers bitboard,
+                  check mask: the squares where a non-king move can resolve the check (all squares if not in check,
+                  none if in double check),
+                  dictionary pinned piece square -> bitboard of the squares it can move to along the pin ray).
+        """
+        king_sq = self.king_square(is_white)
+        if king_sq is None:
+            return 0, FULL_BOARD, {}
+
+        bitboards = self.bitboards
+        pawn, knight, bishop, rook, queen, _ = PIECE_LETTERS[not is_white]
+        own = self.occupancy[is_white]
+        occupied = own | self.occupancy[not is_white]
+
+        checkers = KNIGHT_ATTACKS[king_sq] & bitboards[knight] | PAWN_ATTACKS[is_white][king_sq] & bitboards[pawn]
+        pins = {}
+        snipers = ROOK_MASKS[king_sq] & (bitboards[rook] | bitboards[queen]) | \
+            BISHOP_MASKS[king_sq] & (bitboards[bishop] | bitboards[queen])
+        for sniper in iterate_bits(snipers):
+            between = BETWEEN[king_sq * 64 + sniper]
+            blockers = between & occupied
+            if not blockers:
+                checkers |= 1 << sniper
+            elif blockers & (blockers - 1) == 0 and blockers & own:
+                pins[blockers.bit_length() - 1] = between | 1 << sniper
+
+        if not checkers:
+            check_mask = FULL_BOARD
+        elif checkers & (checkers - 1):
+            check_mask = 0
+        else:
+            check_mask = BETWEEN[king_sq * 64 + checkers.bit_length() - 1] | checkers
+        return checkers, check_mask, pins
+
+    def _legal_moves_from(self, from_square: int, piece: str, checkers: int, check_mask: int,
+                          pins: Dict[int, int]) -> List[Move]:
+        is_white = is_white_piece(piece)
+        kind = piece.upper()
+        own = self.occupancy[is_white]
+        occupied = own | self.occupancy[not is_white]
+
+        if kind == 'K':
+            # The king must not stay on the line of a slider it steps away from, so it is removed from the occupancy.
+            without_king = occupied ^ (1 << from_square)
+            enemy = self.occupancy[not is_white]
+            moves = [from_square | to_square << 6 | (enemy >> to_square & 1) << 15
+                     for to_square in iterate_bits(KING_ATTACKS[from_square] & ~own)
+                     if not self.is_square_attacked(to_square, not is_white, without_king)]
+            if not checkers:
+                moves.extend(self._castling_moves(from_square, is_white))
+            return moves
+
+        target_mask = check_mask & pins.get(from_square, FULL_BOARD)
+        if kind == 'P':
+            return self._pawn_moves(from_square, is_white, occupied, target_mask, True)
+        if not target_mask:
+            return []
+        enemy = self.occupancy[not is_white]
+        return [from_square | to_square << 6 | (enemy >> to_square & 1) << 15
+                for to_square in iterate_bits(self._piece_attacks(kind, from_square, occupied) & ~own & target_mask)]
+
+    def legal_moves_from(self, from_square: int) -> List[Move]:
+        """
+        :param from_square: Square of the moving piece. The piece does not have to be of the side to move.
+        :return: The legal moves of the piece on the square. Empty if the square is empty.
+        """
+        piece = self.board[from_square]
+        if piece is None:
+            return []
+        if is_white_piece(piece) == self.white_to_move:
+            return self.legal_move_set().get(from_square, [])
+        return self._legal_moves_from(from_square, piece, *self.checks_and_pins(is_white_piece(piece)))
+
+    def legal_moves(self) -> List[Move]:
+        """
+        :return: All legal moves of the side to move. Checks and pins are computed only once.
+        """
+        checkers, check_mask, pins = self.checks_and_pins(self.white_to_move)
+        board = self.board
+        moves = []
+        for sq in iterate_bits(self.occupancy[self.white_to_move]):
+            moves.extend(self._legal_moves_from(sq, board[sq], checkers, check_mask, pins))
+        return moves
+
+    def iter_legal_moves(self) -> Iterator[Move]:
+        """
+        Generates the legal moves of the side to move lazily, piece by piece, so the caller can stop at any move.
+        The position must not be changed while iterating.
+        """
+        checkers, check_mask, pins = self.checks_and_pins(self.white_to_move)
+        board = self.board
+        for sq in iterate_bits(self.occupancy[self.white_to_move]):
+            yield from self._legal_moves_from(sq, board[sq], checkers, check_mask, pins)
+
+    def has_legal_move(self) -> bool:
+        """
+        :return: True if the side to move has any legal move. Stops at the first one found.
+        """
+        if self._legal_move_set_hash == self.hash:
+            return bool(self._legal_move_set)
+        return next(self.iter_legal_moves(), None) is not None
+
+    def legal_move_set(self) -> Dict[int, List[Move]]:
+        """
+        All legal moves of the side to move, computed only once per position: the result is kept until the hash
+        changes. (The search calls legal_moves() instead, it would only fill the cache for nothing.)
+        :return: From square -> legal moves from it. Only squares with at least one move are keys. Must not be changed.
+        """
+        if self._legal_move_set_hash != self.hash:
+            move_set: Dict[int, List[Move]] = {}
+            for move in self.legal_moves():
+                move_set.setdefault(move & 63, []).append(move)
+            self._legal_move_set = move_set
+            self._legal_move_set_hash = self.hash
+        return self._legal_move_set
+
+    def legal_moves_of(self, from_squares: int) -> List[Move]:
+        """
+        The legal moves of some pieces of the side to move. Uses the cached legal move set if it is up to date,
+        otherwise generates the moves of the given pieces only.
+        :param from_squares: Bitboard of the squares of the examined pieces.
+        """
+        from_squares &= self.occupancy[self.white_to_move]
+        if self._legal_move_set_hash == self.hash:
+            move_set = self._legal_move_set
+            return [move for sq in iterate_bits(from_squares) for move in move_set.get(sq, ())]
+        checkers, check_mask, pins = self.checks_and_pins(self.white_to_move)
+        board = self.board
+        return [move for sq in iterate_bits(from_squares)
+                for move in self._legal_moves_from(sq, board[sq], checkers, check_mask, pins)]
+
+    def find_move(self, from_square: int, to_square: int, promotion: Optional[str] = None) -> Optional[Move]:
+        """
+        :return: The legal move of the side to move between the given squares, or None if there is not such a move.
+        (Unlike legal_moves_from(), never a move of the other side, as make_move() would let it move out of turn.)
+        """
+        for move in self.legal_move_set().get(from_square, ()):
+            if move >> 6 & 63 == to_square and move_promotion(move) == promotion:
+                return move
+        return None
+
+    @staticmethod
+    def is_castling(move: Move) -> bool:
+        return move >> 12 == MOVE_CASTLING
+
+    @staticmethod
+    def is_en_passant(move: Move) -> bool:
+        return move >> 12 == MOVE_EN_PASSANT
+
+    @staticmethod
+    def captured_square(move: Move) -> int:
+        """
+        :return: The square of the piece captured by the move. (Differs from the target square only for en passant.)
+        """
+        if move >> 12 == MOVE_EN_PASSANT:
+            return square(square_row(move & 63), square_col(move >> 6 & 63))
+        return move >> 6 & 63
+
+    def make_move(self, move: Move) -> Optional[str]:
+        """
+        Performs the move on the position. Does not check legality!
+        :param move: The move of the side to move.
+        :return: The captured piece or None.
+        """
+        board = self.board
+        from_square, to_square, flags = move & 63, move >> 6 & 63, move >> 12
+        piece = board[from_square]
+        if piece is None:
+            raise ValueError(f"There is no piece on square {from_square}.")
+        kind = piece.upper()
+
+        captured_square = to_square if flags != MOVE_EN_PASSANT else self.captured_square(move)
+        self.history.append(Undo(move, piece, board[captured_square], captured_square, self.castling_rights,
+                                 self.en_passant, self.halfmove_clock, self.last_move, self.hash))
+        self.hash ^= ZOBRIST_CASTLING[self.castling_rights] ^ self._en_passant_key()
+
+        captured = self._remove_piece(captured_square)
+
+        self._remove_piece(from_square)
+        if flags & MOVE_PROMOTION:
+            promotion = PROMOTION_PIECES[flags & 3]
+            piece = promotion if is_white_piece(piece) else promotion.lower()
+        self._put_piece(to_square, piece)
+
+        if flags == MOVE_CASTLING:
+            rook_from, rook_to = castling_rook_squares(to_square)
+            self._put_piece(rook_to, self._remove_piece(rook_from))
+
+        self.castling_rights &= ~(CASTLING_MASKS.get(from_square, 0) | CASTLING_MASKS.get(to_square, 0))
+
+        if flags == MOVE_DOUBLE_PUSH:
+            self.en_passant = (from_square + to_square) // 2
+        else:
+            self.en_passant = None
+
+        if kind == 'P' or captured is not None:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if not self.white_to_move:
+            self.fullmove_number += 1
+
+        self.white_to_move = not self.white_to_move
+        self.hash ^= ZOBRIST_CASTLING[self.castling_rights] ^ ZOBRIST_BLACK_TO_MOVE ^ self._en_passant_key()
+        self.last_move = move
+        return captured
+
+    def unmake_move(self) -> Move:
+        """
+        Takes back the last move made by make_move().
+        :return: The taken back move.
+        """
+        if not self.history:
+            raise ValueError("There is no move to unmake.")
+        undo = self.history.pop()
+        move = undo.move
+
+        self.white_to_move = not self.white_to_move
+        if not self.white_to_move:
+            self.fullmove_number -= 1
+
+        from_square, to_square = move & 63, move >> 6 & 63
+        self._remove_piece(to_square)
+        self._put_piece(from_square, undo.moved_piece)
+        if undo.captured is not None:
+            self._put_piece(undo.captured_square, undo.captured)
+
+        if move >> 12 == MOVE_CASTLING:
+            rook_from, rook_to = castling_rook_squares(to_square)
+            self._put_piece(rook_from, self._remove_piece(rook_to))
+
+        self.castling_rights = undo.castling_rights
+        self.en_passant = undo.en_passant
+        self.halfmove_clock = undo.halfmove_clock
+        self.last_move = undo.last_move
+        self.hash = undo.hash
+        return move
+
+    def is_repetition(self) -> bool:
+        """
+        :return: True if the current position already occurred since the last capture or pawn move.
+        """
+        history = self.history
+        for i in range(len(history) - 2, max(len(history) - self.halfmove_clock, 0) - 1, -2):
+            if history[i].hash == self.hash:
+                return True
+        return False
+
+    def is_checkmate(self) -> bool:
+        return self.is_in_check() and not self.has_legal_move()
+
+    def is_stalemate(self) -> bool:
+        return not self.is_in_check() and not self.has_legal_move()
+
+    def has_mating_material(self) -> bool:
+        """
+        Determines whether is there enough force on the board to mate any of the kings.
+        :return: False for K vs K, K + minor piece vs K and bishops only on the same colored squares, True otherwise.
+        """
+        minors = []
+        for sq, piece in enumerate(self.board):
+            if piece is None or piece in 'Kk':
+                continue
+            if piece in 'PpRrQq':
+                return True
+            minors.append((piece.upper(), (square_row(sq) + square_col(sq)) % 2))
+
+        if len(minors) <= 1:
+            return False
+        if all(kind == 'B' for kind, _ in minors) and len({color for _, color in minors}) == 1:
+            return False
+        return True
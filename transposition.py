@@ -0,0 +1,95 @@
+from typing import List, NamedTuple, Optional
+
+import rules
+
+"""
+Contains the transposition table: search results stored by the Zobrist hash of the position, in a bounded memory.
+"""
+
+EXACT = 0
+LOWER_BOUND = 1  # The score is at least this much (the search failed high, beta cutoff).
+UPPER_BOUND = 2  # The score is at most this much (the search failed low, no move raised alpha).
+
+# Estimated memory of one filled slot: the entry tuple, its int fields and the list slot pointing to it.
+ENTRY_BYTES = 200
+
+
+class Entry(NamedTuple):
+    key: int
+    depth: int
+    bound: int
+    score: int
+    best_move: Optional[rules.Move]
+    age: int
+
+
+class TranspositionTable:
+    """
+    Fixed size hash table. Every key has exactly one slot (key modulo the table size), so the memory use never grows.
+    Replacement policy: an entry of an earlier search is always replaced, an entry of the current search only by an
+    at least as deep result (or by any result of the same position).
+    """
+
+    def __init__(self, memory_mb: float = 16):
+        if memory_mb <= 0:
+            raise ValueError(f"Memory budget must be positive, got {memory_mb} MB.")
+
+        # Largest power of two that fits in the budget, so the slot can be found with a mask instead of modulo.
+        size = 1
+        while size * 2 * ENTRY_BYTES <= memory_mb * 1024 * 1024:
+            size *= 2
+        self.size = size
+        self._mask = size - 1
+        self._entries: List[Optional[Entry]] = [None] * size
+        self.age = 0
+        self.filled = 0
+
+    def new_search(self) -> None:
+        """
+        Marks the start of a new search. Older entries are kept for probing, but are replaced first.
+        """
+        self.age += 1
+
+    def clear(self) -> None:
+        self._entries = [None] * self.size
+        self.filled = 0
+
+    def probe(self, key: int) -> Optional[Entry]:
+        """
+        :param key: Zobrist hash of the position.
+        :return: The stored entry of the position, or None if it is not in the table.
+        """
+        entry = self._entries[key & self._mask]
+        if entry is not None and entry.key == key:
+            return entry
+        return None
+
+    def store(self, key: int, depth: int, bound: int, score: int, best_move: Optional[rules.Move]) -> None:
+        """
+        Stores a search result if the replacement policy allows it.
+        :param key: Zobrist hash of the position.
+        :param depth: Remaining depth of the search that produced the score.
+        :param bound: EXACT | LOWER_BOUND | UPPER_BOUND
+        :param score: The score from the side to move's point of view.
+        :param best_move: The best (or refuting) move found, can be None.
+        """
+        index = key & self._mask
+        entry = self._entries[index]
+        if entry is None:
+            self.filled += 1
+        elif entry.key == key:
+            if best_move is None:
+                best_move = entry.best_move
+        elif entry.age == self.age and entry.depth > depth:
+            return
+
+        self._entries[index] = Entry(key, depth, bound, score, best_move, self.age)
+
+    def hashfull(self) -> int:
+        """
+        :return: Filled slots per thousand.
+        """
+        return self.filled * 1000 // self.size
+
+    def __len__(self) -> int:
+        return self.filled